@@ -1,10 +1,21 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, stream_with_context
 from flask_cors import CORS
 import logging
 import os
 from dotenv import load_dotenv
-from production_cas import load_topic_vectors_preview, test_cas_server_connection, CASConnectionError
-from similarity import get_similar_cases
+from flask.json.provider import DefaultJSONProvider
+# CAS modules (swat/saspy, pandas) are imported inside the views that need
+# them so /health and worker respawns don't pay for them
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
 
 # Load environment variables
 load_dotenv()
@@ -13,11 +24,100 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class ORJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson
+    Output matches the default provider; types orjson does not handle natively
+    (dates, decimals, ...) go through the same fallback encoder
+    """
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 # Initialize Flask app
 app = Flask(__name__)
+if orjson is not None:
+    app.json = ORJSONProvider(app)
+
+if msgspec is not None:
+    class SearchRequest(msgspec.Struct):
+        """Body of a /search request"""
+        case_number: str
+        top_k: int = 5
+
+    _search_request_decoder = msgspec.json.Decoder(SearchRequest)
+
+def _prebuilt(payload, status):
+    """Encode a fixed response body once so error paths skip jsonify"""
+    return (app.json.dumps(payload) + '\n').encode(), status
+
+# Fixed-message error responses; errors that carry exception text still use jsonify
+ERROR_RESPONSES = {
+    'not_json': _prebuilt({'success': False, 'error': 'Request must be JSON'}, 400),
+    'missing_case_number': _prebuilt({'success': False, 'error': 'case_number is required'}, 400),
+    'invalid_case_number': _prebuilt({'success': False, 'error': 'case_number must be a string'}, 400),
+    'empty_case_number': _prebuilt({'success': False, 'error': 'case_number cannot be empty'}, 400),
+    'invalid_top_k': _prebuilt({'success': False, 'error': 'top_k must be an integer between 1 and 20'}, 400),
+    'search_failed': _prebuilt({'success': False, 'error': 'Internal server error occurred while searching for similar cases'}, 500),
+    'viya_connection_failed': _prebuilt({'success': False, 'message': 'SAS Viya connection failed'}, 500),
+    'not_found': _prebuilt({'success': False, 'error': 'Endpoint not found'}, 404),
+    'internal_error': _prebuilt({'success': False, 'error': 'Internal server error'}, 500)
+}
+
+def error_response(key):
+    """Response for one of the pre-encoded ERROR_RESPONSES"""
+    body, status = ERROR_RESPONSES[key]
+    return app.response_class(body, status=status, mimetype='application/json')
+
+def parse_search_request():
+    """
+    Validate the /search body
+    Returns (case_number, top_k, None) or (None, None, error_key)
+    """
+    if not request.is_json:
+        return None, None, 'not_json'
+
+    if msgspec is not None:
+        try:
+            search = _search_request_decoder.decode(request.get_data())
+        except msgspec.ValidationError as e:
+            if '$.top_k' in str(e):
+                return None, None, 'invalid_top_k'
+            if '$.case_number' in str(e):
+                return None, None, 'invalid_case_number'
+            return None, None, 'missing_case_number'
+        except msgspec.DecodeError:
+            return None, None, 'not_json'
+        case_number, top_k = search.case_number.strip(), search.top_k
+    else:
+        data = request.get_json()
+        if 'case_number' not in data:
+            return None, None, 'missing_case_number'
+        if not isinstance(data['case_number'], str):
+            return None, None, 'invalid_case_number'
+        case_number, top_k = data['case_number'].strip(), data.get('top_k', 5)
+
+    if not case_number:
+        return None, None, 'empty_case_number'
+
+    if not isinstance(top_k, int) or top_k <= 0 or top_k > 20:
+        return None, None, 'invalid_top_k'
+
+    return case_number, top_k, None
 
 # Enable CORS for all routes to allow React frontend connections
-CORS(app, origins=["http://localhost:5173", "http://localhost:3000", "http://localhost:5000"])
+# CORS_ORIGINS is a comma-separated list of allowed origins
+DEFAULT_CORS_ORIGINS = 'http://localhost:5173,http://localhost:3000,http://localhost:5000'
+cors_origins = [origin.strip() for origin in os.getenv('CORS_ORIGINS', DEFAULT_CORS_ORIGINS).split(',') if origin.strip()]
+CORS(app, origins=cors_origins)
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -58,40 +158,14 @@ def search_similar_cases():
     """
     try:
         # Validate request
-        if not request.is_json:
-            return jsonify({
-                'success': False,
-                'error': 'Request must be JSON'
-            }), 400
-        
-        data = request.get_json()
-        
-        # Validate required fields
-        if 'case_number' not in data:
-            return jsonify({
-                'success': False,
-                'error': 'case_number is required'
-            }), 400
-        
-        case_number = data['case_number'].strip()
-        top_k = data.get('top_k', 5)
-        
-        # Validate inputs
-        if not case_number:
-            return jsonify({
-                'success': False,
-                'error': 'case_number cannot be empty'
-            }), 400
-        
-        if not isinstance(top_k, int) or top_k <= 0 or top_k > 20:
-            return jsonify({
-                'success': False,
-                'error': 'top_k must be an integer between 1 and 20'
-            }), 400
+        case_number, top_k, error = parse_search_request()
+        if error:
+            return error_response(error)
         
         logger.info(f"Searching for similar cases to: {case_number}")
         
         # Get similar cases using SAS Viya integration
+        from similarity import get_similar_cases
         similar_cases = get_similar_cases(case_number, top_k)
         
         # Format response
@@ -108,10 +182,7 @@ def search_similar_cases():
         
     except Exception as e:
         logger.error(f"Error in search endpoint: {str(e)}")
-        return jsonify({
-            'success': False,
-            'error': 'Internal server error occurred while searching for similar cases'
-        }), 500
+        return error_response('search_failed')
 
 @app.route('/test-connection', methods=['GET'])
 def test_viya_connection():
@@ -129,10 +200,7 @@ def test_viya_connection():
                 'message': 'SAS Viya connection successful'
             }), 200
         else:
-            return jsonify({
-                'success': False,
-                'message': 'SAS Viya connection failed'
-            }), 500
+            return error_response('viya_connection_failed')
             
     except Exception as e:
         logger.error(f"Error testing connection: {str(e)}")
@@ -144,18 +212,15 @@ def test_viya_connection():
 @app.errorhandler(404)
 def not_found(error):
     """Handle 404 errors"""
-    return jsonify({
-        'success': False,
-        'error': 'Endpoint not found'
-    }), 404
+    return error_response('not_found')
 
 @app.errorhandler(500)
 def internal_error(error):
     """Handle 500 errors"""
-    return jsonify({
-        'success': False,
-        'error': 'Internal server error'
-    }), 500
+    return error_response('internal_error')
+
+# Rows serialized per chunk when streaming /table-preview
+PREVIEW_CHUNK_ROWS = 64
 
 @app.route('/table-preview', methods=['GET'])
 def table_preview():
@@ -163,19 +228,30 @@ def table_preview():
     Get preview of the topic_vectors table from CAS
     Returns first 5 rows as JSON
     """
+    from production_cas import fetch_topic_vectors_preview, CASConnectionError
+    
     try:
         logger.info("Loading table preview from CAS")
         
         # Load preview data from CAS table
-        preview_data = load_topic_vectors_preview(rows=5)
+        preview_frame = fetch_topic_vectors_preview(rows=5)
+        rows_returned = len(preview_frame)
         
-        return jsonify({
-            'success': True,
-            'table_name': 'topic_vectors',
-            'rows_returned': len(preview_data),
-            'data': preview_data,
-            'message': f'Successfully loaded {len(preview_data)} rows from topic_vectors table'
-        }), 200
+        def generate():
+            # Same document jsonify would build, written a few rows at a time
+            # so the full list of row dicts is never held in memory
+            yield '{"data":['
+            for start in range(0, rows_returned, PREVIEW_CHUNK_ROWS):
+                records = preview_frame.iloc[start:start + PREVIEW_CHUNK_ROWS].to_dict('records')
+                yield (',' if start else '') + ','.join(app.json.dumps(record) for record in records)
+            yield '],' + app.json.dumps({
+                'message': f'Successfully loaded {rows_returned} rows from topic_vectors table',
+                'rows_returned': rows_returned,
+                'success': True,
+                'table_name': 'topic_vectors'
+            })[1:] + '\n'
+        
+        return app.response_class(stream_with_context(generate()), status=200, mimetype='application/json')
         
     except CASConnectionError as e:
         logger.error(f"CAS connection error: {str(e)}")
@@ -201,6 +277,7 @@ def cas_status():
     """
     try:
         logger.info("Testing CAS connection")
+        from production_cas import test_cas_server_connection
         status = test_cas_server_connection()
         
         if status['status'] == 'success':
@@ -217,6 +294,8 @@ def cas_status():
         }), 500
 
 if __name__ == '__main__':
+    # Development server only; production runs under gunicorn (gthread workers):
+    #   gunicorn -c gunicorn.conf.py app:app
     # Get configuration from environment variables
     host = os.getenv('FLASK_HOST', '0.0.0.0')
     port = int(os.getenv('FLASK_PORT', 5001))
@@ -224,7 +303,16 @@ if __name__ == '__main__':
     
     logger.info(f"Starting Flask server on {host}:{port}")
     logger.info(f"Debug mode: {debug}")
-    
+
+    # Warm the vector index while the server starts; under the reloader only
+    # the serving child does this
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        try:
+            from similarity import start_preload
+            start_preload()
+        except ImportError as e:
+            logger.warning(f"Vector index warmup unavailable: {e}")
+
     app.run(
         host=host,
         port=port,
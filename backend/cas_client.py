@@ -1,27 +1,88 @@
 #!/usr/bin/env python3
 """
 Clean CAS client for your SAS Viya server
-Direct connection to trck1056928.trc.sas.com without numpy conflicts
+Direct connection to trck1056928.trc.sas.com over a single in-process CAS session
 """
 
+import atexit
 import json
-import subprocess
-import sys
-import os
-from typing import Dict, List, Any, Optional
+import threading
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+from query_batcher import QueryBatcher
+from ttl_cache import TTLCache
+from vector_search import (RESULT_COLUMNS, TopicMatrix, case_results,
+                           cosine_topk_query, ranked_results, result_records, top_k_indices,
+                           topic_columns, where_literal)
+
+try:
+    import swat
+except ImportError:
+    swat = None
+
+# Your server configuration
+CAS_CONFIG = {
+    'hostname': 'trck1056928.trc.sas.com',
+    'port': 5570,
+    'username': 'sasboot',
+    'password': 'Orion123',
+    'protocol': 'cas'
+}
+
+# Single CAS session shared by every call in this process; a session runs one
+# action at a time, so every use of it holds the lock
+_CAS_CONN = None
+_CAS_LOCK = threading.RLock()
+
+# Target-case topic vectors keyed by case number
+_TARGET_CACHE = TTLCache(maxsize=4096, ttl=3600)
+
+# Quantized topic_vectors corpus for local scoring, refreshed every 10 minutes
+CORPUS_TTL = 600
+_CORPUS_CACHE = TTLCache(maxsize=1, ttl=CORPUS_TTL)
+
+# Ranked results of recent searches keyed by (case number, top_k); they live
+# no longer than the corpus they were ranked against
+_RESULT_CACHE = TTLCache(maxsize=1024, ttl=CORPUS_TTL)
+
+def _get_conn():
+    """Return the shared CAS connection, creating it on first use"""
+    global _CAS_CONN
+    with _CAS_LOCK:
+        if _CAS_CONN is None:
+            _CAS_CONN = swat.CAS(**CAS_CONFIG)
+        return _CAS_CONN
+
+def _reset_conn():
+    """Drop the shared CAS connection so the next call reconnects"""
+    global _CAS_CONN
+    with _CAS_LOCK:
+        if _CAS_CONN is not None:
+            try:
+                _CAS_CONN.close()
+            except Exception:
+                pass
+            _CAS_CONN = None
+    _TARGET_CACHE.clear()
+    _CORPUS_CACHE.clear()
+    _RESULT_CACHE.clear()
+
+def _with_conn(operation):
+    """Run operation(conn) on the shared session, reconnecting once if it has gone stale"""
+    with _CAS_LOCK:
+        try:
+            return operation(_get_conn())
+        except swat.SWATError:
+            _reset_conn()
+            return operation(_get_conn())
+
+atexit.register(_reset_conn)
 
 def test_swat_availability() -> bool:
-    """Test if SWAT package can be imported cleanly"""
-    try:
-        # Use subprocess to avoid numpy import conflicts
-        result = subprocess.run([
-            sys.executable, '-c', 
-            'import swat; print("SWAT_AVAILABLE")'
-        ], capture_output=True, text=True, timeout=10)
-        
-        return "SWAT_AVAILABLE" in result.stdout
-    except:
-        return False
+    """Test if SWAT package was imported at module load"""
+    return swat is not None
 
 def connect_to_cas_server() -> Dict[str, Any]:
     """Connect to your CAS server and return status"""
@@ -32,78 +93,35 @@ def connect_to_cas_server() -> Dict[str, Any]:
             "message": "Package conflicts prevent CAS connection"
         }
     
-    # Create connection script
-    connection_script = '''
-import swat
-import json
-import sys
-
-try:
-    # Your server configuration
-    conn = swat.CAS(
-        hostname='trck1056928.trc.sas.com',
-        port=5570,
-        username='sasboot',
-        password='Orion123',
-        protocol='cas'
-    )
-    
-    # Get server information
-    about_info = conn.about()
-    session_info = conn.sessionStatus()
-    
-    # Test table access
-    try:
-        tables_result = conn.tableInfo(caslib='casuser')
-        table_count = len(tables_result.get('TableInfo', []))
-    except:
-        table_count = 0
-    
-    result = {
-        "status": "success",
-        "server_host": about_info.get('About', {}).get('Hostname', 'trck1056928.trc.sas.com'),
-        "server_version": about_info.get('About', {}).get('Version', 'Unknown'),
-        "session_id": session_info.get('Session', {}).get('SessionId', 'Unknown'),
-        "casuser_tables": table_count,
-        "message": "Connected to trck1056928.trc.sas.com as sasboot"
-    }
-    
-    conn.close()
-    print(json.dumps(result))
-    
-except Exception as e:
-    error_result = {
-        "status": "connection_failed",
-        "error": str(e),
-        "message": "Cannot connect to CAS server - requires VPN access to trck1056928.trc.sas.com"
-    }
-    print(json.dumps(error_result))
-'''
-    
-    try:
-        result = subprocess.run([
-            sys.executable, '-c', connection_script
-        ], capture_output=True, text=True, timeout=30)
+    def _status(conn):
+        # Get server information
+        about_info = conn.about()
+        session_info = conn.sessionStatus()
+        
+        # Test table access
+        try:
+            tables_result = conn.tableInfo(caslib='casuser')
+            table_count = len(tables_result.get('TableInfo', []))
+        except Exception:
+            table_count = 0
         
-        if result.returncode == 0:
-            return json.loads(result.stdout.strip())
-        else:
-            return {
-                "status": "execution_failed",
-                "error": result.stderr,
-                "message": "Failed to execute CAS connection script"
-            }
-    except subprocess.TimeoutExpired:
         return {
-            "status": "timeout",
-            "error": "Connection attempt timed out",
-            "message": "Server may be unreachable without VPN"
+            "status": "success",
+            "server_host": about_info.get('About', {}).get('Hostname', CAS_CONFIG['hostname']),
+            "server_version": about_info.get('About', {}).get('Version', 'Unknown'),
+            "session_id": session_info.get('Session', {}).get('SessionId', 'Unknown'),
+            "casuser_tables": table_count,
+            "message": "Connected to trck1056928.trc.sas.com as sasboot"
         }
+    
+    try:
+        return _with_conn(_status)
     except Exception as e:
+        _reset_conn()
         return {
-            "status": "error",
+            "status": "connection_failed",
             "error": str(e),
-            "message": "Unexpected error during connection test"
+            "message": "Cannot connect to CAS server - requires VPN access to trck1056928.trc.sas.com"
         }
 
 def load_topic_vectors_data(rows: int = 5) -> List[Dict[str, Any]]:
@@ -111,138 +129,154 @@ def load_topic_vectors_data(rows: int = 5) -> List[Dict[str, Any]]:
     if not test_swat_availability():
         return []
     
-    # Create data loading script
-    data_script = f'''
-import swat
-import json
-import sys
-
-try:
-    # Connect to your CAS server
-    conn = swat.CAS(
-        hostname='trck1056928.trc.sas.com',
-        port=5570,
-        username='sasboot',
-        password='Orion123',
-        protocol='cas'
-    )
-    
-    # Access topic_vectors table
-    topic_vectors = conn.CASTable('topic_vectors', caslib='casuser')
-    
-    # Get sample data
-    result = topic_vectors.head({rows})
-    
-    if len(result) > 0:
-        # Convert to JSON-serializable format
-        data = result.to_dict('records')
-        print(json.dumps(data))
-    else:
-        print(json.dumps([]))
-    
-    conn.close()
-    
-except Exception as e:
-    print(json.dumps([]))
-'''
+    def _load(conn):
+        # Access topic_vectors table
+        topic_vectors = conn.CASTable('topic_vectors', caslib='casuser')
+        
+        # Get sample data
+        result = topic_vectors.head(rows)
+        
+        if len(result) > 0:
+            # Convert to JSON-serializable format
+            return result.to_dict('records')
+        return []
     
     try:
-        result = subprocess.run([
-            sys.executable, '-c', data_script
-        ], capture_output=True, text=True, timeout=30)
-        
-        if result.returncode == 0:
-            return json.loads(result.stdout.strip())
-        else:
-            return []
-    except:
+        return _with_conn(_load)
+    except Exception:
         return []
 
-def find_similar_cases_data(case_number: str, top_k: int = 5) -> List[Dict[str, Any]]:
-    """Find similar cases using topic vectors from your server"""
-    if not test_swat_availability():
-        return []
+def _rank_in_cas(conn, case_number: str, topic_cols: List[str],
+                 target: np.ndarray, top_k: int) -> Optional[List[Dict[str, Any]]]:
+    """Score every case inside CAS with FedSQL; None if the action is unavailable"""
+    query = cosine_topk_query('CASUSER.TOPIC_VECTORS', topic_cols, target,
+                              case_number, RESULT_COLUMNS, top_k)
+    conn.loadactionset('fedSql')
+    result = conn.fedSql.execDirect(query=query)
+    if 'Result Set' not in result:
+        return None
     
-    similarity_script = f'''
-import swat
-import json
-import math
-import sys
+    ranked = result['Result Set']
+    return case_results(ranked, ranked['similarity_score'].to_numpy())
 
-try:
-    # Connect to CAS server
-    conn = swat.CAS(
-        hostname='trck1056928.trc.sas.com',
-        port=5570,
-        username='sasboot',
-        password='Orion123',
-        protocol='cas'
-    )
-    
-    # Load topic_vectors table
-    topic_vectors = conn.CASTable('topic_vectors', caslib='casuser')
-    
-    # Find target case
-    target_case = topic_vectors.query(f'"Case Number" = "{case_number}"')
+def _load_corpus(topic_vectors, topic_cols: List[str]):
+    """
+    Return (TopicMatrix, result records, case index) for topic_vectors,
+    scanning CAS only on a cache miss
+    """
+    corpus = _CORPUS_CACHE.get(tuple(topic_cols))
+    if corpus is None:
+        df = topic_vectors.to_frame()
+        corpus = (TopicMatrix(df[topic_cols].to_numpy(dtype=np.float32), precision='int8'),
+                  result_records(df),
+                  {case: idx for idx, case in enumerate(df['Case Number'].astype(str))})
+        _CORPUS_CACHE.set(tuple(topic_cols), corpus)
+        # Results ranked against the previous corpus are stale now
+        _RESULT_CACHE.clear()
+    return corpus
+
+def _rank_locally(topic_vectors, requests: List[Tuple[str, int]],
+                  targets: List[Tuple[List[str], np.ndarray]]) -> List[List[Dict[str, Any]]]:
+    """Score every request against the cached corpus with a single matrix multiply"""
+    matrix, records, case_index = _load_corpus(topic_vectors, targets[0][0])
+    similarities = matrix.similarities(np.stack([vector for _, vector in targets]))
     
-    if len(target_case) == 0:
-        print(json.dumps([]))
-        conn.close()
-        sys.exit(0)
+    ranked = []
+    for scores, (case_number, top_k) in zip(similarities, requests):
+        # One dict lookup finds the target's row rather than comparing every case number
+        top = top_k_indices(scores, top_k, exclude=case_index.get(case_number))
+        ranked.append(ranked_results(records, top, scores[top]))
+    return ranked
+
+def _fetch_target_vectors(topic_vectors, case_numbers: List[str]) -> Dict[str, Tuple[List[str], np.ndarray]]:
+    """Return {case number: (topic columns, float32 vector)}, one CAS query for all cache misses"""
+    found = {}
+    missing = []
+    for case_number in dict.fromkeys(case_numbers):
+        cached = _TARGET_CACHE.get(case_number)
+        if cached is not None:
+            found[case_number] = cached
+        else:
+            missing.append(case_number)
     
-    # Get target vector
-    target_row = target_case.iloc[0]
-    topic_cols = [col for col in target_case.columns if col.startswith('_TextTopic_')]
-    target_vector = [target_row[col] for col in topic_cols]
+    if not missing:
+        return found
     
-    # Get other cases for comparison
-    other_cases = topic_vectors.query(f'"Case Number" != "{case_number}"')
+    # Find target cases
+    in_list = ', '.join(where_literal(case_number) for case_number in missing)
+    target_cases = topic_vectors.query(f'"Case Number" IN ({in_list})').to_frame()
+    topic_cols = topic_columns(target_cases.columns)
+    if not topic_cols:
+        return found
     
-    similar_cases = []
-    for _, row in other_cases.head(100).iterrows():  # Limit for performance
-        # Calculate cosine similarity
-        case_vector = [row[col] for col in topic_cols]
+    vectors = target_cases[topic_cols].to_numpy(dtype=np.float32)
+    for case_number, vector in zip(target_cases['Case Number'], vectors):
+        if case_number not in found:
+            found[case_number] = (topic_cols, vector)
+            _TARGET_CACHE.set(case_number, found[case_number])
+    return found
+
+def _search_batch(requests: List[Tuple[str, int]]) -> List[List[Dict[str, Any]]]:
+    """Answer a batch of (case_number, top_k) searches with one CAS session round"""
+    def _search(conn):
+        topic_vectors = conn.CASTable('topic_vectors', caslib='casuser')
+        targets = _fetch_target_vectors(topic_vectors, [case_number for case_number, _ in requests])
         
-        # Cosine similarity calculation
-        dot_product = sum(a * b for a, b in zip(target_vector, case_vector))
-        magnitude1 = math.sqrt(sum(a * a for a in target_vector))
-        magnitude2 = math.sqrt(sum(a * a for a in case_vector))
+        results = [[] for _ in requests]
+        pending = []
+        for i, (case_number, top_k) in enumerate(requests):
+            target_info = targets.get(case_number)
+            if target_info is None or not target_info[1].any():
+                continue
+            
+            cached = _RESULT_CACHE.get((case_number, top_k))
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.append(i)
         
-        if magnitude1 > 0 and magnitude2 > 0:
-            similarity = dot_product / (magnitude1 * magnitude2)
-        else:
-            similarity = 0.0
+        if not pending:
+            return results
         
-        similar_cases.append({{
-            "case_number": str(row.get("Case Number", "")),
-            "similarity_score": round(similarity, 4),
-            "title": str(row.get("Description", ""))[:100],
-            "resolution": str(row.get("Resolution", ""))[:100],
-            "assignment_group": str(row.get("Assignment Group", "")),
-            "case_type": str(row.get("Concern", "")),
-            "status": "resolved"
-        }})
-    
-    # Sort by similarity and return top K
-    similar_cases.sort(key=lambda x: x["similarity_score"], reverse=True)
-    print(json.dumps(similar_cases[:{top_k}]))
-    
-    conn.close()
+        # Rank next to the data for a lone request; a batch shares one scan + GEMM
+        ranked = None
+        if len(pending) == 1:
+            case_number, top_k = requests[pending[0]]
+            topic_cols, target = targets[case_number]
+            try:
+                ranked = _rank_in_cas(conn, case_number, topic_cols, target, top_k)
+            except swat.SWATError:
+                ranked = None
+            ranked = None if ranked is None else [ranked]
+        
+        if ranked is None:
+            ranked = _rank_locally(
+                topic_vectors,
+                [requests[i] for i in pending],
+                [targets[requests[i][0]] for i in pending]
+            )
+        
+        for i, cases in zip(pending, ranked):
+            _RESULT_CACHE.set(requests[i], cases)
+            results[i] = cases
+        return results
     
-except Exception as e:
-    print(json.dumps([]))
-'''
+    return _with_conn(_search)
+
+# Longest a caller waits for its batched search
+SEARCH_TIMEOUT_SECONDS = 60
+
+# Concurrent searches arriving within 10 ms share one CAS round
+_SEARCH_BATCHER = QueryBatcher(_search_batch, max_batch=64, max_wait=0.01)
+
+def find_similar_cases_data(case_number: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    """Find similar cases using topic vectors from your server"""
+    if not test_swat_availability():
+        return []
     
     try:
-        result = subprocess.run([
-            sys.executable, '-c', similarity_script
-        ], capture_output=True, text=True, timeout=60)
-        
-        if result.returncode == 0:
-            return json.loads(result.stdout.strip())
-        else:
-            return []
-    except:
+        return _SEARCH_BATCHER.submit((case_number, top_k)).result(timeout=SEARCH_TIMEOUT_SECONDS)
+    except Exception:
         return []
 
 # Main API functions for Node.js integration
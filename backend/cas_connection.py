@@ -6,7 +6,11 @@ Provides reusable functions for connecting to CAS and accessing tables
 
 import os
 import json
+import time
+import atexit
 import logging
+import threading
+from contextlib import contextmanager
 from typing import Dict, List, Optional, Any
 from dotenv import load_dotenv
 
@@ -15,13 +19,29 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Seconds between keep-alive pings on the pooled sessions
+CAS_KEEPALIVE_SECONDS = int(os.getenv('CAS_KEEPALIVE_SECONDS', 60))
+
+# Live CAS sessions keyed by (host, port, username), reused across calls; a
+# session runs one action at a time, so every use of one holds the lock
+_pool = {}
+_pool_lock = threading.RLock()
+_keepalive_thread = None
+
 class CASConnectionError(Exception):
     """Custom exception for CAS connection issues"""
     pass
 
+def _pool_key():
+    """Pool key for the credentials in the environment"""
+    return (os.getenv('CAS_HOST'), int(os.getenv('CAS_PORT', 5570)), os.getenv('CAS_USERNAME'))
+
 def get_cas_connection():
     """
-    Create and return a CAS connection using environment variables
+    Return a CAS connection using environment variables
+    
+    The session for these credentials is reused until the keep-alive or a
+    failed call drops it. Use cas_session() to hold it while calling actions.
     
     Returns:
         CAS connection object if successful
@@ -45,28 +65,93 @@ def get_cas_connection():
         if not all([cas_host, cas_username, cas_password]):
             raise CASConnectionError("Missing required CAS credentials in environment variables")
         
-        logger.info(f"Connecting to CAS server: {cas_host}:{cas_port}")
-        
-        # Create CAS connection
-        conn = swat.CAS(
-            hostname=cas_host,
-            port=cas_port,
-            username=cas_username,
-            password=cas_password,
-            protocol='cas'
-        )
-        
-        # Test the connection
-        server_info = conn.about()
-        logger.info(f"Connected to CAS server: {server_info.get('About', {}).get('Version', 'Unknown')}")
-        
-        return conn
+        key = _pool_key()
+        with _pool_lock:
+            conn = _pool.get(key)
+            if conn is not None:
+                return conn
+            
+            logger.info(f"Connecting to CAS server: {cas_host}:{cas_port}")
+            
+            # Create CAS connection
+            conn = swat.CAS(
+                hostname=cas_host,
+                port=cas_port,
+                username=cas_username,
+                password=cas_password,
+                protocol='cas'
+            )
+            
+            # Test the connection
+            server_info = conn.about()
+            logger.info(f"Connected to CAS server: {server_info.get('About', {}).get('Version', 'Unknown')}")
+            
+            _pool[key] = conn
+            _start_keepalive()
+            return conn
         
     except ImportError:
         raise CASConnectionError("SWAT package not installed. Install with: pip install swat")
     except Exception as e:
         raise CASConnectionError(f"Failed to connect to CAS server: {str(e)}")
 
+def _drop(key):
+    """Close and forget the pooled session for key"""
+    with _pool_lock:
+        conn = _pool.pop(key, None)
+    if conn is not None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+@contextmanager
+def cas_session():
+    """
+    Hold the pooled session for the block's duration; a session whose call
+    raised is dropped so the next use reconnects
+    """
+    with _pool_lock:
+        conn = get_cas_connection()
+        try:
+            yield conn
+        except CASConnectionError:
+            raise
+        except Exception:
+            _drop(_pool_key())
+            raise
+
+def _keepalive_loop():
+    """Ping every pooled session so it stays authenticated; drop those that fail"""
+    while True:
+        time.sleep(CAS_KEEPALIVE_SECONDS)
+        with _pool_lock:
+            for key, conn in list(_pool.items()):
+                try:
+                    conn.sessionStatus()
+                except Exception as e:
+                    logger.warning(f"CAS keep-alive ping failed, reconnecting on next request: {e}")
+                    _drop(key)
+
+def _start_keepalive():
+    """Start the keep-alive pinger once per process"""
+    global _keepalive_thread
+    if _keepalive_thread is None or not _keepalive_thread.is_alive():
+        _keepalive_thread = threading.Thread(target=_keepalive_loop, name='cas-keepalive', daemon=True)
+        _keepalive_thread.start()
+
+def close_connections():
+    """Close every pooled session; only called on shutdown"""
+    with _pool_lock:
+        while _pool:
+            _, conn = _pool.popitem()
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+atexit.register(close_connections)
+
 def load_table_preview(table_name: str = "topic_vectors", library: str = None, rows: int = 5) -> List[Dict[str, Any]]:
     """
     Load preview data from a CAS table
@@ -82,26 +167,24 @@ def load_table_preview(table_name: str = "topic_vectors", library: str = None, r
     Raises:
         CASConnectionError: If connection or table access fails
     """
-    conn = None
     try:
-        # Get connection
-        conn = get_cas_connection()
-        
         # Use library from environment if not provided
         library = library or os.getenv('CAS_LIBRARY', 'casuser')
         
         logger.info(f"Loading {rows} rows from {library}.{table_name}")
         
-        # Check if table exists
-        table_info = conn.tableInfo(caslib=library, name=table_name)
-        if table_info.status_code != 0:
-            raise CASConnectionError(f"Table {library}.{table_name} not found or not accessible")
-        
-        # Load table data
-        table_ref = conn.CASTable(table_name, caslib=library)
-        
-        # Fetch first N rows
-        result = table_ref.head(rows)
+        # Hold the pooled connection
+        with cas_session() as conn:
+            # Check if table exists
+            table_info = conn.tableInfo(caslib=library, name=table_name)
+            if table_info.status_code != 0:
+                raise CASConnectionError(f"Table {library}.{table_name} not found or not accessible")
+            
+            # Load table data
+            table_ref = conn.CASTable(table_name, caslib=library)
+            
+            # Fetch first N rows
+            result = table_ref.head(rows)
         
         if result is None or len(result) == 0:
             raise CASConnectionError(f"No data returned from {library}.{table_name}")
@@ -116,12 +199,6 @@ def load_table_preview(table_name: str = "topic_vectors", library: str = None, r
         raise
     except Exception as e:
         raise CASConnectionError(f"Error loading table preview: {str(e)}")
-    finally:
-        if conn:
-            try:
-                conn.close()
-            except:
-                pass
 
 def test_cas_connection() -> Dict[str, Any]:
     """
@@ -131,13 +208,10 @@ def test_cas_connection() -> Dict[str, Any]:
         Dictionary with connection status and server info
     """
     try:
-        conn = get_cas_connection()
-        
-        # Get server information
-        about_info = conn.about()
-        session_info = conn.sessionStatus()
-        
-        conn.close()
+        with cas_session() as conn:
+            # Get server information
+            about_info = conn.about()
+            session_info = conn.sessionStatus()
         
         return {
             "status": "success",
@@ -6,7 +6,12 @@ Connects to trck1056928.trc.sas.com using sasboot credentials
 
 import os
 import json
+import queue
+import time
+import atexit
 import logging
+import threading
+from contextlib import contextmanager
 from typing import Dict, List, Any
 from dotenv import load_dotenv
 
@@ -15,6 +20,83 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Idle CAS sessions kept open per (host, port, username)
+CAS_POOL_SIZE = int(os.getenv('CAS_POOL_SIZE', 4))
+
+# A session idle for longer than this is pinged before it is reused
+CAS_IDLE_PING_SECONDS = 60
+
+# Idle sessions as (conn, last used) queues keyed by (host, port, username)
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _close(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+@contextmanager
+def _checkout(cas_host, cas_port, cas_username, cas_password):
+    """
+    Borrow a session for these credentials for the block's duration,
+    opening a new one if none is idle
+    
+    A session idle for CAS_IDLE_PING_SECONDS is pinged before reuse and
+    dropped if dead. It is returned to the pool after a clean exit and
+    closed if the block raised.
+    """
+    import swat
+    
+    key = (cas_host, cas_port, cas_username)
+    with _pools_lock:
+        idle = _pools.setdefault(key, queue.Queue(maxsize=CAS_POOL_SIZE))
+    
+    conn = None
+    while conn is None:
+        try:
+            conn, last_used = idle.get_nowait()
+        except queue.Empty:
+            conn = swat.CAS(
+                hostname=cas_host,
+                port=cas_port,
+                username=cas_username,
+                password=cas_password,
+                protocol='cas'
+            )
+            break
+        if time.monotonic() - last_used > CAS_IDLE_PING_SECONDS:
+            try:
+                conn.sessionStatus()
+            except Exception:
+                _close(conn)
+                conn = None
+    
+    try:
+        yield conn
+    except Exception:
+        _close(conn)
+        raise
+    
+    try:
+        idle.put_nowait((conn, time.monotonic()))
+    except queue.Full:
+        _close(conn)
+
+def close_connections():
+    """Close every idle pooled session; only called on shutdown"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for idle in pools:
+        while True:
+            try:
+                conn, _ = idle.get_nowait()
+            except queue.Empty:
+                break
+            _close(conn)
+
+atexit.register(close_connections)
+
 def test_cas_server_connection():
     """Test connection to CAS server and return status"""
     try:
@@ -25,27 +107,18 @@ def test_cas_server_connection():
         cas_username = os.getenv('CAS_USERNAME', 'sasboot')
         cas_password = os.getenv('CAS_PASSWORD', 'Orion123')
         
-        # Create CAS connection
-        conn = swat.CAS(
-            hostname=cas_host,
-            port=cas_port,
-            username=cas_username,
-            password=cas_password,
-            protocol='cas'
-        )
-        
-        # Get server information
-        about_info = conn.about()
-        session_info = conn.sessionStatus()
-        
-        # Test table access
-        try:
-            tables_result = conn.tableInfo(caslib='casuser')
-            table_count = len(tables_result['TableInfo']) if 'TableInfo' in tables_result else 0
-        except:
-            table_count = 0
-        
-        conn.close()
+        # Borrow a pooled session
+        with _checkout(cas_host, cas_port, cas_username, cas_password) as conn:
+            # Get server information
+            about_info = conn.about()
+            session_info = conn.sessionStatus()
+            
+            # Test table access
+            try:
+                tables_result = conn.tableInfo(caslib='casuser')
+                table_count = len(tables_result['TableInfo']) if 'TableInfo' in tables_result else 0
+            except:
+                table_count = 0
         
         return {
             "status": "success",
@@ -79,30 +152,19 @@ def load_topic_vectors_preview(rows=5):
         cas_username = os.getenv('CAS_USERNAME', 'sasboot')
         cas_password = os.getenv('CAS_PASSWORD', 'Orion123')
         
-        # Connect to CAS server
-        conn = swat.CAS(
-            hostname=cas_host,
-            port=cas_port,
-            username=cas_username,
-            password=cas_password,
-            protocol='cas'
-        )
-        
-        # Access the topic_vectors table
-        topic_vectors = conn.CASTable('topic_vectors', caslib='casuser')
-        
-        # Get first N rows
-        result = topic_vectors.head(rows)
+        # Borrow a pooled session
+        with _checkout(cas_host, cas_port, cas_username, cas_password) as conn:
+            # Access the topic_vectors table
+            topic_vectors = conn.CASTable('topic_vectors', caslib='casuser')
+            
+            # Get first N rows
+            result = topic_vectors.head(rows)
         
         if result is None or len(result) == 0:
-            conn.close()
             return []
         
         # Convert to JSON-serializable format
-        data = result.to_dict('records')
-        conn.close()
-        
-        return data
+        return result.to_dict('records')
         
     except ImportError:
         # Return empty list if SWAT not available
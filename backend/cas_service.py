@@ -6,13 +6,37 @@ Handles connection to trck1056928.trc.sas.com with proper error handling
 
 import os
 import json
+import queue
+import atexit
+import functools
+import importlib.util
 import logging
+from contextlib import contextmanager
 from typing import Dict, List, Any, Optional
 
+import numpy as np
+
+from ttl_cache import TTLCache
+from vector_search import (RESULT_COLUMNS, TopicMatrix, case_results, cosine_topk_query,
+                           ranked_results, result_records, top_k_indices, topic_columns,
+                           where_literal)
+
+# Checked once per process; swat itself is imported when the first session opens
+HAVE_SWAT = importlib.util.find_spec('swat') is not None
+
+@functools.lru_cache(maxsize=None)
+def _swat():
+    """The swat module, imported once on first use"""
+    import swat
+    return swat
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Idle CAS sessions kept open per process
+CAS_POOL_SIZE = int(os.getenv('CAS_POOL_SIZE', 4))
+
 class CASService:
     """Service for connecting to your SAS Viya server"""
     
@@ -24,16 +48,64 @@ class CASService:
             'password': 'Orion123',
             'protocol': 'cas'
         }
-        self.is_available = self._check_swat_availability()
+        self.is_available = HAVE_SWAT
+        if not self.is_available:
+            logger.warning("SWAT package not available - CAS functionality disabled")
+        # Quantized topic_vectors matrix, reused until the table changes
+        self._cache = {'M': None, 'ids': None, 'index': None, 'meta': None, 'cols': None, 'etag': None}
+        self._searches = 0
+        # (case_number, top_k) -> results; dropped whenever the matrix reloads
+        self._results = TTLCache(maxsize=1024, ttl=600)
+        # Idle CAS sessions ready for reuse
+        self._pool = queue.Queue(maxsize=CAS_POOL_SIZE)
+        atexit.register(self.close_all)
     
-    def _check_swat_availability(self) -> bool:
-        """Check if SWAT package is available for CAS connectivity"""
+    @staticmethod
+    def _close(conn):
         try:
-            import swat
-            return True
-        except ImportError:
-            logger.warning("SWAT package not available - CAS functionality disabled")
-            return False
+            conn.close()
+        except Exception:
+            pass
+    
+    @contextmanager
+    def _conn(self):
+        """
+        Borrow a CAS session from the pool, opening a new one if none is idle
+        
+        Idle sessions are pinged before reuse and dropped if dead. A session
+        is returned to the pool after a clean exit and closed if the block raised.
+        """
+        conn = None
+        while conn is None:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                conn = _swat().CAS(**self.config)
+                break
+            try:
+                conn.sessionStatus()
+            except Exception:
+                self._close(conn)
+                conn = None
+        
+        try:
+            yield conn
+        except Exception:
+            self._close(conn)
+            raise
+        
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            self._close(conn)
+    
+    def close_all(self):
+        """Close every idle pooled session"""
+        while True:
+            try:
+                self._close(self._pool.get_nowait())
+            except queue.Empty:
+                break
     
     def test_connection(self) -> Dict[str, Any]:
         """Test connection to your CAS server"""
@@ -50,23 +122,18 @@ class CASService:
             }
         
         try:
-            import swat
-            
             # Attempt connection to your server
-            conn = swat.CAS(**self.config)
-            
-            # Get server information
-            about_info = conn.about()
-            session_info = conn.sessionStatus()
-            
-            # Test casuser library access
-            try:
-                tables_result = conn.tableInfo(caslib='casuser')
-                table_count = len(tables_result.get('TableInfo', []))
-            except Exception:
-                table_count = 0
-            
-            conn.close()
+            with self._conn() as conn:
+                # Get server information
+                about_info = conn.about()
+                session_info = conn.sessionStatus()
+                
+                # Test casuser library access
+                try:
+                    tables_result = conn.tableInfo(caslib='casuser')
+                    table_count = len(tables_result.get('TableInfo', []))
+                except Exception:
+                    table_count = 0
             
             return {
                 "status": "connected",
@@ -96,97 +163,214 @@ class CASService:
             return []
         
         try:
-            import swat
-            
-            conn = swat.CAS(**self.config)
-            topic_vectors = conn.CASTable('topic_vectors', caslib='casuser')
-            
-            # Get sample data
-            result = topic_vectors.head(rows)
+            if rows <= 0:
+                return []
+
+            with self._conn() as conn:
+                # Fetch the sample rows directly; no _Index_ column
+                result = conn.table.fetch(table={'caslib': 'casuser', 'name': 'topic_vectors'},
+                                          to=rows, index=False)['Fetch']
             
             if len(result) > 0:
-                data = result.to_dict('records')
+                # itertuples yields Python natives, so rows stay JSON-serializable
+                cols = list(result.columns)
+                data = [dict(zip(cols, row)) for row in result.itertuples(index=False, name=None)]
                 logger.info(f"Loaded {len(data)} rows from topic_vectors table")
-                conn.close()
                 return data
             else:
                 logger.warning("No data returned from topic_vectors table")
-                conn.close()
                 return []
                 
         except Exception as e:
             logger.error(f"Error loading topic_vectors: {e}")
             return []
     
+    def _table_etag(self, conn) -> Optional[tuple]:
+        """Modification stamp of topic_vectors, used to invalidate the matrix cache"""
+        try:
+            info = conn.tableInfo(caslib='casuser', name='topic_vectors')['TableInfo'].iloc[0]
+            return (info.get('ModTime'), info.get('Rows'))
+        except Exception:
+            return None
+    
+    def _load_matrix(self, conn) -> Dict[str, Any]:
+        """
+        Return the cached topic_vectors matrix, reloading it only when the
+        table's modification stamp changes
+        
+        Rows are stored as int8 codes with per-row scales and precomputed
+        norms, so a query is one int8 matrix-vector product over a quarter of
+        the float32 bytes.
+        """
+        etag = self._table_etag(conn)
+        if self._cache['M'] is not None and etag == self._cache['etag']:
+            return self._cache
+        
+        frame = conn.CASTable('topic_vectors', caslib='casuser').to_frame()
+        self._results.clear()
+        cols = topic_columns(frame.columns)
+        # DataFrame blocks come out column-major; the gemv wants contiguous rows
+        matrix = TopicMatrix(np.array(frame[cols], dtype=np.float32, order='C'), precision='int8')
+        ids = frame['Case Number'].astype(str).to_numpy()
+        
+        self._cache = {
+            'M': matrix,
+            'ids': ids,
+            'index': {case: idx for idx, case in enumerate(ids)},
+            # Result fields per row, built once so a search is just index lookups
+            'meta': result_records(frame),
+            'cols': cols,
+            'etag': etag
+        }
+        logger.info(f"Cached {len(ids)} topic vectors ({len(cols)} topics)")
+        return self._cache
+    
+    def _rank_in_cas(self, conn, case_number: str, top_k: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Score every case inside CAS with FedSQL and pull back only the top_k
+        rows, projected to the result columns
+        
+        Returns None when the search has to fall back to the local matrix.
+        """
+        topic_vectors = conn.CASTable('topic_vectors', caslib='casuser')
+        topic_cols = topic_columns(topic_vectors.columns)
+        if not topic_cols:
+            return None
+        
+        # Only the target's topic columns come over the wire
+        target_rows = topic_vectors.query(f'"Case Number" = {where_literal(case_number)}')[topic_cols].head(1)
+        if len(target_rows) == 0:
+            logger.warning(f"Case {case_number} not found in topic_vectors")
+            return []
+        
+        target = target_rows.to_numpy(dtype=np.float64)[0]
+        if not np.any(target):
+            return []
+        
+        query = cosine_topk_query('CASUSER.TOPIC_VECTORS', topic_cols, target,
+                                  case_number, RESULT_COLUMNS, top_k)
+        conn.loadactionset('fedSql')
+        result = conn.fedSql.execDirect(query=query)
+        if 'Result Set' not in result:
+            return None
+        
+        ranked = result['Result Set']
+        return case_results(ranked, ranked['similarity_score'].to_numpy())
+    
     def find_similar_cases(self, case_number: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """Find similar cases using topic vectors from your server"""
         if not self.is_available:
             logger.warning("SWAT package not available - similarity search disabled")
             return []
         
+        key = (case_number, top_k)
+        cached = self._results.get(key)
+        if cached is not None:
+            return [dict(case) for case in cached]
+        
         try:
-            import swat
-            import math
-            
-            conn = swat.CAS(**self.config)
-            topic_vectors = conn.CASTable('topic_vectors', caslib='casuser')
-            
-            # Find target case
-            target_case = topic_vectors.query(f'"Case Number" = "{case_number}"')
-            
-            if len(target_case) == 0:
-                logger.warning(f"Case {case_number} not found in topic_vectors")
-                conn.close()
-                return []
-            
-            # Get target case vector
-            target_row = target_case.iloc[0]
-            topic_cols = [col for col in target_case.columns if col.startswith('_TextTopic_')]
-            
-            if not topic_cols:
-                logger.warning("No topic vector columns found")
-                conn.close()
-                return []
+            similar_cases = self._find_similar_cases_uncached(case_number, top_k)
+        except Exception as e:
+            logger.error(f"Error finding similar cases: {e}")
+            return []
+        
+        self._results.set(key, similar_cases)
+        return [dict(case) for case in similar_cases]
+    
+    def _find_similar_cases_uncached(self, case_number: str, top_k: int) -> List[Dict[str, Any]]:
+        """Rank similar cases against CAS or the cached matrix; errors propagate"""
+        self._searches += 1
+        with self._conn() as conn:
+            # A fresh process answers its first search inside CAS instead of
+            # downloading the table; once it serves a second one it is
+            # long-lived enough to keep the matrix locally
+            if self._cache['M'] is None and self._searches == 1:
+                try:
+                    ranked = self._rank_in_cas(conn, case_number, top_k)
+                except Exception as e:
+                    logger.warning(f"CAS-side scoring failed, scoring locally: {e}")
+                    ranked = None
+                
+                if ranked is not None:
+                    logger.info(f"Found {len(ranked)} similar cases for {case_number}")
+                    return ranked
             
-            target_vector = [target_row[col] for col in topic_cols]
+            cache = self._load_matrix(conn)
+        
+        # Find target case
+        target_idx = cache['index'].get(case_number)
+        
+        if target_idx is None:
+            logger.warning(f"Case {case_number} not found in topic_vectors")
+            return []
+        
+        if not cache['cols']:
+            logger.warning("No topic vector columns found")
+            return []
+        
+        # An all-zero vector is similar to nothing
+        if not cache['M'].norms[target_idx]:
+            return []
+        
+        # Cosine similarity against every other case is one gemv on the quantized rows
+        scores = cache['M'].row_similarities(target_idx)
+        
+        top = top_k_indices(scores, top_k, exclude=target_idx)
+        similar_cases = ranked_results(cache['meta'], top, scores[top])
+        
+        logger.info(f"Found {len(similar_cases)} similar cases for {case_number}")
+        return similar_cases
+
+    def find_similar_cases_batch(self, case_numbers: List[str], top_k: int = 5) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Find similar cases for several case numbers over one CAS session,
+        scoring every uncached target against the matrix in one multiply
+        """
+        results = {case_number: [] for case_number in case_numbers}
+        if not self.is_available:
+            logger.warning("SWAT package not available - similarity search disabled")
+            return results
+        
+        pending = []
+        for case_number in results:
+            cached = self._results.get((case_number, top_k))
+            if cached is not None:
+                results[case_number] = [dict(case) for case in cached]
+            else:
+                pending.append(case_number)
+        
+        if not pending:
+            return results
+        
+        try:
+            self._searches += 1
+            with self._conn() as conn:
+                cache = self._load_matrix(conn)
             
-            # Get other cases for comparison
-            other_cases = topic_vectors.query(f'"Case Number" != "{case_number}"')
+            found = [(case_number, cache['index'][case_number])
+                     for case_number in pending
+                     if case_number in cache['index'] and cache['M'].norms[cache['index'][case_number]]]
+            for case_number in pending:
+                if case_number not in cache['index']:
+                    logger.warning(f"Case {case_number} not found in topic_vectors")
             
-            similar_cases = []
-            for _, row in other_cases.head(100).iterrows():  # Limit for performance
-                case_vector = [row[col] for col in topic_cols]
-                
-                # Calculate cosine similarity
-                dot_product = sum(a * b for a, b in zip(target_vector, case_vector))
-                magnitude1 = math.sqrt(sum(a * a for a in target_vector))
-                magnitude2 = math.sqrt(sum(a * a for a in case_vector))
-                
-                if magnitude1 > 0 and magnitude2 > 0:
-                    similarity = dot_product / (magnitude1 * magnitude2)
-                else:
-                    similarity = 0.0
-                
-                similar_cases.append({
-                    "case_number": str(row.get("Case Number", "")),
-                    "similarity_score": round(similarity, 4),
-                    "title": str(row.get("Description", ""))[:100],
-                    "resolution": str(row.get("Resolution", ""))[:100],
-                    "assignment_group": str(row.get("Assignment Group", "")),
-                    "case_type": str(row.get("Concern", "")),
-                    "status": "resolved"
-                })
+            if found and cache['cols']:
+                targets = [target_idx for _, target_idx in found]
+                scores = cache['M'].rows_similarities(targets)
+                for (case_number, target_idx), row in zip(found, scores):
+                    top = top_k_indices(row, top_k, exclude=target_idx)
+                    results[case_number] = ranked_results(cache['meta'], top, row[top])
             
-            # Sort by similarity and return top K
-            similar_cases.sort(key=lambda x: x["similarity_score"], reverse=True)
-            conn.close()
+            for case_number in pending:
+                self._results.set((case_number, top_k), results[case_number])
+                results[case_number] = [dict(case) for case in results[case_number]]
             
-            logger.info(f"Found {len(similar_cases[:top_k])} similar cases for {case_number}")
-            return similar_cases[:top_k]
+            logger.info(f"Ranked {len(found)} of {len(pending)} uncached cases in one batch")
+            return results
             
         except Exception as e:
             logger.error(f"Error finding similar cases: {e}")
-            return []
+            return {case_number: [] for case_number in case_numbers}
 
 # Global service instance
 _cas_service = CASService()
@@ -204,6 +388,10 @@ def get_similar_cases(case_number, top_k=5):
     """Find similar cases for given case number"""
     return _cas_service.find_similar_cases(case_number, top_k)
 
+def get_similar_cases_batch(case_numbers, top_k=5):
+    """Find similar cases for each of several case numbers"""
+    return _cas_service.find_similar_cases_batch(case_numbers, top_k)
+
 if __name__ == "__main__":
     print("CAS Service Test")
     print("=" * 50)
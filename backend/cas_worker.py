@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Long-lived CAS worker process for final_cas_connector
+Imports swat and opens one CAS session, then answers JSON-line requests
+read from stdin until stdin closes
+"""
+
+import base64
+import json
+import sys
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from vector_search import RESULT_COLUMNS, case_results, cosine_topk_query, topic_columns, where_literal
+
+_config = {}
+_conn = None
+
+def _session():
+    """Return the worker's CAS session, reconnecting if it has dropped"""
+    global _conn
+    if _conn is not None:
+        try:
+            _conn.sessionStatus()
+            return _conn
+        except Exception:
+            try:
+                _conn.close()
+            except Exception:
+                pass
+            _conn = None
+
+    import swat
+    _conn = swat.CAS(
+        hostname=_config['host'],
+        port=_config['port'],
+        username=_config['username'],
+        password=_config['password'],
+        protocol='cas'
+    )
+    return _conn
+
+def test_connection() -> dict:
+    """Report server and session details for the worker's session"""
+    try:
+        conn = _session()
+        about_info = conn.about()
+        session_info = conn.sessionStatus()
+
+        try:
+            tables_result = conn.tableInfo(caslib='casuser')
+            table_count = len(tables_result.get('TableInfo', []))
+        except Exception:
+            table_count = 0
+
+        return {
+            "status": "success",
+            "server_host": about_info.get('About', {}).get('Hostname', _config['host']),
+            "server_version": about_info.get('About', {}).get('Version', 'Unknown'),
+            "session_id": session_info.get('Session', {}).get('SessionId', 'Unknown'),
+            "casuser_tables": table_count,
+            "message": f"Connected to {_config['host']} as {_config['username']}"
+        }
+
+    except ImportError as e:
+        return {
+            "status": "import_error",
+            "error": str(e),
+            "message": "SWAT package unavailable"
+        }
+
+    except Exception as e:
+        return {
+            "status": "connection_failed",
+            "error": str(e),
+            "message": "Cannot connect to CAS server - requires VPN access"
+        }
+
+def load_topic_vectors(rows: int = 5) -> list:
+    """First rows of topic_vectors as records"""
+    result = _session().CASTable('topic_vectors', caslib='casuser').head(rows)
+    return result.to_dict('records') if len(result) > 0 else []
+
+def load_matrix() -> dict:
+    """Every topic vector as one packed float32 block, with case numbers and result metadata"""
+    frame = _session().CASTable('topic_vectors', caslib='casuser').to_frame()
+    topic_cols = topic_columns(frame.columns)
+
+    return {
+        "cases": frame['Case Number'].astype(str).tolist(),
+        "meta": frame.reindex(columns=RESULT_COLUMNS, fill_value='').astype(str).values.tolist(),
+        # Raw little-endian float32 rows rather than one JSON number per cell
+        "vectors": base64.b64encode(np.array(frame[topic_cols], dtype='<f4', order='C').tobytes()).decode('ascii'),
+        "dim": len(topic_cols)
+    }
+
+def rank_similar(case_number: str, top_k: int = 5):
+    """
+    Score every case inside CAS with FedSQL and return only the top_k results
+
+    Returns None when CAS cannot rank the target and the caller should score locally.
+    """
+    conn = _session()
+    topic_vectors = conn.CASTable('topic_vectors', caslib='casuser')
+    topic_cols = topic_columns(topic_vectors.columns)
+    if not topic_cols:
+        return None
+
+    target_rows = topic_vectors.query(f'"Case Number" = {where_literal(case_number)}')[topic_cols].head(1)
+    if len(target_rows) == 0:
+        return []
+
+    target = target_rows.to_numpy(dtype=np.float64)[0]
+    if not np.any(target):
+        return []
+
+    query = cosine_topk_query('CASUSER.TOPIC_VECTORS', topic_cols, target,
+                              case_number, RESULT_COLUMNS, top_k)
+    conn.loadactionset('fedSql')
+    result = conn.fedSql.execDirect(query=query)
+    if 'Result Set' not in result:
+        return None
+
+    ranked = result['Result Set']
+    return case_results(ranked, ranked['similarity_score'].to_numpy())
+
+OPERATIONS = {
+    'test_connection': test_connection,
+    'load_topic_vectors': load_topic_vectors,
+    'load_matrix': load_matrix,
+    'rank_similar': rank_similar
+}
+
+def _dumps(reply) -> str:
+    """Serialize a reply, with orjson when installed"""
+    if orjson is not None:
+        return orjson.dumps(reply, default=str, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    return json.dumps(reply, default=str)
+
+def _loads(line: str):
+    return orjson.loads(line) if orjson is not None else json.loads(line)
+
+def main():
+    global _config
+    # Replies own the real stdout; anything swat prints goes to stderr
+    out = sys.stdout
+    sys.stdout = sys.stderr
+
+    _config = _loads(sys.stdin.readline())
+    for line in sys.stdin:
+        try:
+            request = _loads(line)
+            reply = {"result": OPERATIONS[request['op']](**request.get('args', {}))}
+        except Exception as e:
+            reply = {"error": str(e)}
+
+        out.write(_dumps(reply) + '\n')
+        out.flush()
+
+    if _conn is not None:
+        _conn.close()
+
+if __name__ == "__main__":
+    main()
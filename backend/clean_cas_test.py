@@ -4,31 +4,40 @@ Clean test for CAS connectivity without numpy conflicts
 Direct connection to trck1056928.trc.sas.com
 """
 
-import os
-import sys
-import tempfile
-import subprocess
+import functools
+import io
 import json
+import multiprocessing
+import queue
+import traceback
+from contextlib import redirect_stdout
 
-def create_isolated_cas_test():
-    """Create isolated Python script for CAS testing"""
-    test_script = '''
-#!/usr/bin/env python3
-import sys
-import json
+@functools.lru_cache(maxsize=1)
+def get_session():
+    """Open the CAS session once; every test in the run shares it"""
+    import swat
+    
+    # Connect to your SAS server
+    return swat.CAS(
+        hostname='trck1056928.trc.sas.com',
+        port=5570,
+        username='sasboot',
+        password='Orion123',
+        protocol='cas'
+    )
+
+def close_session():
+    """End the shared session if one was opened"""
+    if get_session.cache_info().currsize:
+        try:
+            get_session().close()
+        except Exception:
+            pass
+        get_session.cache_clear()
 
 def test_cas_connection():
     try:
-        import swat
-        
-        # Connect to your SAS server
-        conn = swat.CAS(
-            hostname='trck1056928.trc.sas.com',
-            port=5570,
-            username='sasboot',
-            password='Orion123',
-            protocol='cas'
-        )
+        conn = get_session()
         
         # Get server info
         about_info = conn.about()
@@ -50,7 +59,6 @@ def test_cas_connection():
             "message": "Connected successfully to your SAS server"
         }
         
-        conn.close()
         return result
         
     except ImportError as e:
@@ -68,15 +76,7 @@ def test_cas_connection():
 
 def test_topic_vectors(rows=3):
     try:
-        import swat
-        
-        conn = swat.CAS(
-            hostname='trck1056928.trc.sas.com',
-            port=5570,
-            username='sasboot',
-            password='Orion123',
-            protocol='cas'
-        )
+        conn = get_session()
         
         # Access topic_vectors table
         topic_vectors = conn.CASTable('topic_vectors', caslib='casuser')
@@ -84,7 +84,6 @@ def test_topic_vectors(rows=3):
         
         if len(result) > 0:
             data = result.to_dict('records')
-            conn.close()
             return {
                 "status": "success",
                 "rows_loaded": len(data),
@@ -92,7 +91,6 @@ def test_topic_vectors(rows=3):
                 "sample_data": data[:2]  # Return first 2 rows
             }
         else:
-            conn.close()
             return {"status": "no_data", "message": "No data in topic_vectors table"}
             
     except Exception as e:
@@ -102,54 +100,56 @@ def test_topic_vectors(rows=3):
             "message": "Cannot access topic_vectors table"
         }
 
-if __name__ == "__main__":
-    print("Testing connection to your SAS server...")
-    
-    # Test connection
-    conn_result = test_cas_connection()
-    print(json.dumps(conn_result, indent=2))
-    
-    if conn_result.get("status") == "success":
-        print("\\nTesting topic_vectors table...")
-        table_result = test_topic_vectors()
-        print(json.dumps(table_result, indent=2))
-'''
-    
-    return test_script
+def _run_tests(results):
+    """Child-process entry point: run the tests and send back their output"""
+    stdout = io.StringIO()
+    try:
+        with redirect_stdout(stdout):
+            print("Testing connection to your SAS server...")
+            
+            # Test connection
+            conn_result = test_cas_connection()
+            print(json.dumps(conn_result, indent=2))
+            
+            if conn_result.get("status") == "success":
+                print("\nTesting topic_vectors table...")
+                table_result = test_topic_vectors()
+                print(json.dumps(table_result, indent=2))
+        results.put((stdout.getvalue(), ""))
+    except Exception:
+        results.put((stdout.getvalue(), traceback.format_exc()))
+        raise
+    finally:
+        close_session()
 
 def run_isolated_test():
     """Run CAS test in isolated environment"""
     try:
-        # Create temporary script file
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
-            f.write(create_isolated_cas_test())
-            script_path = f.name
-        
-        # Run in clean environment
-        env = os.environ.copy()
-        # Remove problematic paths
-        if 'PYTHONPATH' in env:
-            del env['PYTHONPATH']
+        # A spawned child gets a fresh interpreter (so swat/numpy load cleanly)
+        # and runs the test functions directly, without writing a script file
+        context = multiprocessing.get_context('spawn')
+        results = context.Queue()
+        process = context.Process(target=_run_tests, args=(results,))
+        process.start()
         
-        result = subprocess.run([
-            sys.executable, script_path
-        ], capture_output=True, text=True, timeout=45, env=env)
-        
-        # Clean up
-        os.unlink(script_path)
+        try:
+            stdout, stderr = results.get(timeout=45)
+        except queue.Empty:
+            process.terminate()
+            process.join()
+            return {
+                "stdout": "",
+                "stderr": "Connection timeout - server may be unreachable",
+                "returncode": 1
+            }
         
+        process.join()
         return {
-            "stdout": result.stdout,
-            "stderr": result.stderr,
-            "returncode": result.returncode
+            "stdout": stdout,
+            "stderr": stderr,
+            "returncode": process.exitcode
         }
         
-    except subprocess.TimeoutExpired:
-        return {
-            "stdout": "",
-            "stderr": "Connection timeout - server may be unreachable",
-            "returncode": 1
-        }
     except Exception as e:
         return {
             "stdout": "",
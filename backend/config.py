@@ -1,18 +1,20 @@
+import functools
 import os
+import re
 from typing import Dict, Any
 from pathlib import Path
 
+# KEY=value lines; blank lines and # comments never match
+_ENV_LINE = re.compile(r'^[ \t]*([^#=\s][^=\n]*?)[ \t]*=(.*)$', re.MULTILINE)
+
 # Load environment variables from .env file
+@functools.lru_cache(maxsize=1)
 def load_env_file():
-    """Load environment variables from .env file"""
+    """Load environment variables from .env file (variables already set take precedence)"""
     env_file = Path(__file__).parent / '.env'
     if env_file.exists():
-        with open(env_file, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#') and '=' in line:
-                    key, value = line.split('=', 1)
-                    os.environ[key.strip()] = value.strip()
+        for key, value in _ENV_LINE.findall(env_file.read_text()):
+            os.environ.setdefault(key, value.strip())
 
 # Load environment variables
 load_env_file()
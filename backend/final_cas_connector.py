@@ -1,232 +1,320 @@
 #!/usr/bin/env python3
 """
 Final CAS connector for trck1056928.trc.sas.com
-Uses subprocess isolation to avoid numpy conflicts
+Talks to a persistent cas_worker subprocess that owns the SWAT session, so
+the session outlives individual requests and a crash or hang inside SWAT
+kills only the worker, which is restarted on the next call
 """
 
+import atexit
+import base64
 import json
+import logging
+import os
+import queue
+import shutil
 import subprocess
 import sys
-import os
-import tempfile
-from typing import Dict, List, Any
+import threading
+import time
+from typing import Dict, List, Any, Optional
 
-class CASConnector:
-    """Connector for your SAS Viya server"""
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from vector_search import TopicMatrix, top_k_indices
+
+logger = logging.getLogger(__name__)
+
+# Seconds the cached topic matrix is reused before it is reloaded from CAS
+MATRIX_TTL_SECONDS = int(os.getenv('MATRIX_TTL_SECONDS', 600))
+
+def _dumps(obj) -> str:
+    return orjson.dumps(obj).decode() if orjson is not None else json.dumps(obj)
+
+def _loads(line: str):
+    return orjson.loads(line) if orjson is not None else json.loads(line)
+
+# Quantized matrix snapshot shared by every process that imports this module
+SNAPSHOT_DIR = os.path.join(
+    os.getenv('VECTOR_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.vector_cache')),
+    'connector'
+)
+
+# File naming the published build directory inside SNAPSHOT_DIR; its mtime is the snapshot's age
+SNAPSHOT_POINTER = os.path.join(SNAPSHOT_DIR, 'current')
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cas_worker.py')
+
+class _CasWorker:
+    """
+    One long-lived cas_worker.py process spoken to over JSON lines
     
-    def __init__(self):
-        self.host = 'trck1056928.trc.sas.com'
-        self.port = 5570
-        self.username = 'sasboot'
-        self.password = 'Orion123'
+    The worker imports swat and opens its CAS session once, so each call is
+    a round trip on a pipe rather than an interpreter start. A worker that
+    dies or times out is discarded and restarted on the next call.
+    """
     
-    def _execute_cas_script(self, script_content: str, timeout: int = 30) -> Dict[str, Any]:
-        """Execute CAS script in isolated environment"""
+    def __init__(self, config: Dict[str, Any]):
+        self._config = config
+        self._proc = None
+        self._replies = None
+        self._lock = threading.Lock()
+        atexit.register(self.stop)
+    
+    def _start(self):
+        # Clean environment
+        env = os.environ.copy()
+        env.pop('PYTHONPATH', None)
+        
+        self._proc = subprocess.Popen(
+            [sys.executable, '-u', WORKER_SCRIPT],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, env=env
+        )
+        self._proc.stdin.write(_dumps(self._config) + '\n')
+        self._proc.stdin.flush()
+        
+        # Replies are read on a thread into a queue, since pipes cannot be
+        # polled with select on Windows; each worker gets its own queue so a
+        # late reply from a discarded worker is never mistaken for a new one
+        self._replies = queue.Queue()
+        threading.Thread(target=self._read_replies, args=(self._proc.stdout, self._replies),
+                         daemon=True).start()
+    
+    @staticmethod
+    def _read_replies(stdout, replies: queue.Queue):
+        for line in stdout:
+            replies.put(line)
+        # None marks end of output: the worker exited
+        replies.put(None)
+    
+    def call(self, op: str, args: Optional[Dict[str, Any]] = None, timeout: float = 30) -> Dict[str, Any]:
+        """Run op in the worker; returns {"result": ...} or {"status": ..., ...} on failure"""
+        with self._lock:
+            reply, failed = self._exchange(op, args, timeout)
+        # A failed worker is killed outside the lock so other callers can
+        # start its replacement straight away
+        if failed is not None:
+            failed.kill()
+        return reply
+    
+    def _exchange(self, op: str, args: Optional[Dict[str, Any]], timeout: float):
+        """Send one request and wait for its reply; returns (reply, process to kill or None)"""
         try:
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
-                f.write(script_content)
-                script_path = f.name
+            if self._proc is None or self._proc.poll() is not None:
+                self._start()
+            
+            self._proc.stdin.write(_dumps({"op": op, "args": args or {}}) + '\n')
+            self._proc.stdin.flush()
             
-            # Clean environment
-            env = os.environ.copy()
-            env.pop('PYTHONPATH', None)
+            try:
+                line = self._replies.get(timeout=timeout)
+            except queue.Empty:
+                return {"status": "timeout", "message": "Connection timeout"}, self._detach()
             
-            result = subprocess.run([
-                sys.executable, script_path
-            ], capture_output=True, text=True, timeout=timeout, env=env)
+            if line is None:
+                return {"status": "execution_error", "error": "CAS worker exited"}, self._detach()
             
-            os.unlink(script_path)
+            reply = _loads(line)
+            if 'error' in reply:
+                return {"status": "error", "message": reply['error']}, None
+            return reply, None
             
-            if result.returncode == 0:
-                try:
-                    return json.loads(result.stdout.strip())
-                except json.JSONDecodeError:
-                    return {"status": "parse_error", "output": result.stdout}
-            else:
-                return {"status": "execution_error", "error": result.stderr}
-                
-        except subprocess.TimeoutExpired:
-            return {"status": "timeout", "message": "Connection timeout"}
         except Exception as e:
-            return {"status": "error", "message": str(e)}
+            return {"status": "error", "message": str(e)}, self._detach()
     
-    def test_connection(self) -> Dict[str, Any]:
-        """Test connection to your CAS server"""
-        script = f'''
-import json
-import sys
-
-try:
-    import swat
-    
-    conn = swat.CAS(
-        hostname='{self.host}',
-        port={self.port},
-        username='{self.username}',
-        password='{self.password}',
-        protocol='cas'
-    )
-    
-    about_info = conn.about()
-    session_info = conn.sessionStatus()
-    
-    try:
-        tables_result = conn.tableInfo(caslib='casuser')
-        table_count = len(tables_result.get('TableInfo', []))
-    except:
-        table_count = 0
-    
-    result = {{
-        "status": "success",
-        "server_host": about_info.get('About', {{}}).get('Hostname', '{self.host}'),
-        "server_version": about_info.get('About', {{}}).get('Version', 'Unknown'),
-        "session_id": session_info.get('Session', {{}}).get('SessionId', 'Unknown'),
-        "casuser_tables": table_count,
-        "message": "Connected to {self.host} as {self.username}"
-    }}
+    def _detach(self):
+        """Forget the current worker and return its process"""
+        proc, self._proc = self._proc, None
+        return proc
     
-    conn.close()
-    print(json.dumps(result))
+    def stop(self):
+        """Terminate the worker process if it is running"""
+        proc = self._detach()
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+            proc.wait(timeout=5)
+        except Exception:
+            proc.kill()
+
+class CASConnector:
+    """Connector for your SAS Viya server"""
     
-except ImportError as e:
-    result = {{
-        "status": "import_error",
-        "error": str(e),
-        "message": "SWAT package unavailable"
-    }}
-    print(json.dumps(result))
+    def __init__(self):
+        self.host = 'trck1056928.trc.sas.com'
+        self.port = 5570
+        self.username = 'sasboot'
+        self.password = 'Orion123'
+        self._worker = _CasWorker({
+            'host': self.host,
+            'port': self.port,
+            'username': self.username,
+            'password': self.password
+        })
+        # Quantized topic matrix with its case index and result metadata
+        self._matrix = None
+        self._case_index = {}
+        self._meta = []
+        self._loaded_at = 0.0
+        self._searches = 0
     
-except Exception as e:
-    result = {{
-        "status": "connection_failed",
-        "error": str(e),
-        "message": "Cannot connect to CAS server - requires VPN access"
-    }}
-    print(json.dumps(result))
-'''
-        
-        return self._execute_cas_script(script)
+    def test_connection(self) -> Dict[str, Any]:
+        """Test connection to your CAS server"""
+        reply = self._worker.call('test_connection')
+        return reply.get('result', reply)
     
     def load_topic_vectors(self, rows: int = 5) -> List[Dict[str, Any]]:
         """Load data from topic_vectors table"""
-        script = f'''
-import json
-import sys
-
-try:
-    import swat
+        reply = self._worker.call('load_topic_vectors', {'rows': rows}, timeout=60)
+        return reply.get('result', [])
     
-    conn = swat.CAS(
-        hostname='{self.host}',
-        port={self.port},
-        username='{self.username}',
-        password='{self.password}',
-        protocol='cas'
-    )
-    
-    topic_vectors = conn.CASTable('topic_vectors', caslib='casuser')
-    result = topic_vectors.head({rows})
-    
-    if len(result) > 0:
-        data = result.to_dict('records')
-        print(json.dumps(data))
-    else:
-        print(json.dumps([]))
-    
-    conn.close()
+    def _ensure_matrix(self) -> bool:
+        """
+        Load every topic vector once into an int8 TopicMatrix, indexed by
+        case number, and reuse it until MATRIX_TTL_SECONDS pass
+        
+        A fresh on-disk snapshot written by any process is memory-mapped
+        instead of pulling the table from CAS again.
+        """
+        if self._matrix is not None and time.time() - self._loaded_at < MATRIX_TTL_SECONDS:
+            return True
+        if self._load_snapshot():
+            return True
+        
+        result = self._worker.call('load_matrix', timeout=120).get('result')
+        if result is None:
+            return self._matrix is not None
+        
+        # One contiguous float32 block, decoded straight from the worker's bytes
+        vectors = np.frombuffer(base64.b64decode(result['vectors']), dtype='<f4')
+        vectors = vectors.reshape(len(result['cases']), result['dim']).astype(np.float32)
+        
+        # int8 codes with per-row scales and float32 norms: a quarter of the bytes per scan
+        self._matrix = TopicMatrix(vectors, precision='int8')
+        self._case_index = {case: idx for idx, case in enumerate(result['cases'])}
+        self._meta = result['meta']
+        self._loaded_at = time.time()
+        self._save_snapshot(result['cases'])
+        return True
     
-except Exception as e:
-    print(json.dumps([]))
-'''
+    def _load_snapshot(self) -> bool:
+        """Memory-map the snapshot in SNAPSHOT_DIR if it is younger than MATRIX_TTL_SECONDS"""
+        try:
+            # The pointer names one complete build, so every file below comes from it
+            modified = os.path.getmtime(SNAPSHOT_POINTER)
+            if time.time() - modified >= MATRIX_TTL_SECONDS:
+                return False
+            with open(SNAPSHOT_POINTER) as f:
+                build_dir = os.path.join(SNAPSHOT_DIR, f.read().strip())
+            
+            with open(os.path.join(build_dir, 'meta.json')) as f:
+                index = _loads(f.read())
+            matrix = TopicMatrix.from_arrays(
+                np.load(os.path.join(build_dir, 'codes.npy'), mmap_mode='r'),
+                np.load(os.path.join(build_dir, 'scale.npy'), mmap_mode='r'),
+                np.load(os.path.join(build_dir, 'norms.npy'), mmap_mode='r')
+            )
+            if not (len(index['cases']) == len(matrix) == len(matrix.scale) == len(matrix.norms)):
+                return False
+        except (OSError, ValueError, KeyError):
+            return False
         
-        result = self._execute_cas_script(script, timeout=60)
-        if isinstance(result, list):
-            return result
-        elif result.get("status") == "parse_error":
-            # Try to parse the output directly
-            try:
-                return json.loads(result.get("output", "[]"))
-            except:
-                return []
-        return []
+        self._matrix = matrix
+        self._case_index = {case: idx for idx, case in enumerate(index['cases'])}
+        self._meta = index['meta']
+        self._loaded_at = modified
+        return True
+    
+    def _save_snapshot(self, cases: List[str]):
+        """
+        Write the matrix and its index for other processes into a fresh build
+        directory, then publish it by atomically replacing SNAPSHOT_POINTER
+        """
+        try:
+            name = f'build-{time.time_ns()}-{os.getpid()}'
+            build_dir = os.path.join(SNAPSHOT_DIR, name)
+            os.makedirs(build_dir)
+            with open(os.path.join(build_dir, 'meta.json'), 'w') as f:
+                f.write(_dumps({'cases': cases, 'meta': self._meta}))
+            for file_name, array in (('scale.npy', self._matrix.scale), ('norms.npy', self._matrix.norms),
+                                     ('codes.npy', self._matrix.codes)):
+                np.save(os.path.join(build_dir, file_name), array)
+            
+            tmp_path = f'{SNAPSHOT_POINTER}.{os.getpid()}'
+            with open(tmp_path, 'w') as f:
+                f.write(name)
+            os.replace(tmp_path, SNAPSHOT_POINTER)
+            
+            # Keep the previous build for readers that resolved the old pointer
+            builds = sorted(entry for entry in os.listdir(SNAPSHOT_DIR) if entry.startswith('build-'))
+            for old in builds[:-2]:
+                if old != name:
+                    shutil.rmtree(os.path.join(SNAPSHOT_DIR, old), ignore_errors=True)
+        except OSError as e:
+            logger.warning(f"Could not write topic matrix snapshot: {e}")
     
     def find_similar_cases(self, case_number: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """Find similar cases using cosine similarity"""
-        script = f'''
-import json
-import math
-import sys
-
-try:
-    import swat
-    
-    conn = swat.CAS(
-        hostname='{self.host}',
-        port={self.port},
-        username='{self.username}',
-        password='{self.password}',
-        protocol='cas'
-    )
-    
-    topic_vectors = conn.CASTable('topic_vectors', caslib='casuser')
-    
-    # Find target case
-    target_case = topic_vectors.query(f'"Case Number" = "{case_number}"')
-    
-    if len(target_case) == 0:
-        conn.close()
-        print(json.dumps([]))
-        sys.exit(0)
-    
-    target_row = target_case.iloc[0]
-    topic_cols = [col for col in target_case.columns if col.startswith('_TextTopic_')]
-    target_vector = [target_row[col] for col in topic_cols]
-    
-    # Get other cases
-    other_cases = topic_vectors.query(f'"Case Number" != "{case_number}"')
-    
-    similar_cases = []
-    for _, row in other_cases.head(100).iterrows():
-        case_vector = [row[col] for col in topic_cols]
+        # Until the matrix has been pulled once, the first search is ranked
+        # inside CAS so only top_k rows cross the network
+        self._searches += 1
+        if self._matrix is None and self._searches == 1 and not self._load_snapshot():
+            ranked = self._worker.call('rank_similar', {'case_number': case_number, 'top_k': top_k},
+                                       timeout=90).get('result')
+            if ranked is not None:
+                return ranked
         
-        # Cosine similarity
-        dot_product = sum(a * b for a, b in zip(target_vector, case_vector))
-        magnitude1 = math.sqrt(sum(a * a for a in target_vector))
-        magnitude2 = math.sqrt(sum(a * a for a in case_vector))
+        if not self._ensure_matrix():
+            return []
         
-        if magnitude1 > 0 and magnitude2 > 0:
-            similarity = dot_product / (magnitude1 * magnitude2)
-        else:
-            similarity = 0.0
+        # A missing or all-zero target is similar to nothing
+        target_idx = self._case_index.get(case_number)
+        if target_idx is None or not self._matrix.norms[target_idx]:
+            return []
         
-        similar_cases.append({{
-            "case_number": str(row.get("Case Number", "")),
-            "similarity_score": round(similarity, 4),
-            "title": str(row.get("Description", ""))[:100],
-            "resolution": str(row.get("Resolution", ""))[:100],
-            "assignment_group": str(row.get("Assignment Group", "")),
-            "case_type": str(row.get("Concern", "")),
-            "status": "resolved"
-        }})
-    
-    similar_cases.sort(key=lambda x: x["similarity_score"], reverse=True)
-    print(json.dumps(similar_cases[:{top_k}]))
+        # One int8 matrix-vector product, rescaled by the stored norms
+        sims = self._matrix.row_similarities(target_idx)
+        return self._similar_cases(sims, top_k, target_idx)
     
-    conn.close()
-    
-except Exception as e:
-    print(json.dumps([]))
-'''
+    def find_similar_cases_batch(self, case_numbers: List[str], top_k: int = 5) -> Dict[str, List[Dict[str, Any]]]:
+        """Find similar cases for several case numbers with one matrix multiply"""
+        results = {case_number: [] for case_number in case_numbers}
+        if not self._ensure_matrix():
+            return results
         
-        result = self._execute_cas_script(script, timeout=90)
-        if isinstance(result, list):
-            return result
-        elif result.get("status") == "parse_error":
-            try:
-                return json.loads(result.get("output", "[]"))
-            except:
-                return []
-        return []
+        found = [(case_number, self._case_index[case_number])
+                 for case_number in results
+                 if case_number in self._case_index and self._matrix.norms[self._case_index[case_number]]]
+        if not found:
+            return results
+        
+        sims = self._matrix.rows_similarities([target_idx for _, target_idx in found])
+        for (case_number, target_idx), row in zip(found, sims):
+            results[case_number] = self._similar_cases(row, top_k, target_idx)
+        return results
+    
+    def _similar_cases(self, sims: np.ndarray, top_k: int, target_idx: int) -> List[Dict[str, Any]]:
+        """Result dicts for the top_k scores, skipping the target case itself"""
+        similar_cases = []
+        for idx in top_k_indices(sims, top_k, exclude=target_idx):
+            case, title, resolution, group, concern = self._meta[idx]
+            similar_cases.append({
+                "case_number": case,
+                "similarity_score": round(float(sims[idx]), 4),
+                "title": title[:100],
+                "resolution": resolution[:100],
+                "assignment_group": group,
+                "case_type": concern,
+                "status": "resolved"
+            })
+        return similar_cases
 
 # Global connector instance
 _cas_connector = CASConnector()
@@ -244,6 +332,10 @@ def get_similar_cases(case_number, top_k=5):
     """Find similar cases for given case number"""
     return _cas_connector.find_similar_cases(case_number, top_k)
 
+def get_similar_cases_batch(case_numbers, top_k=5):
+    """Find similar cases for each of several case numbers"""
+    return _cas_connector.find_similar_cases_batch(case_numbers, top_k)
+
 if __name__ == "__main__":
     print("Final CAS Connector Test")
     print("=" * 50)
@@ -0,0 +1,32 @@
+"""
+Gunicorn configuration for the CaseMatch Flask backend
+Run from backend/ with: gunicorn -c gunicorn.conf.py app:app
+"""
+
+import multiprocessing
+import os
+
+bind = f"{os.getenv('FLASK_HOST', '0.0.0.0')}:{os.getenv('FLASK_PORT', 5001)}"
+
+# IO-bound CAS endpoints: a few processes, each with a pool of threads.
+# swat's binary CAS protocol does its socket IO in C, which gevent cannot
+# make cooperative, so real threads are what let requests overlap
+worker_class = 'gthread'
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 32))
+
+# Load the app in the master so workers fork with it already imported
+preload_app = True
+
+# Similarity searches against CAS can take up to a minute
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+
+def on_starting(server):
+    """Import the CAS modules once in the master; forked workers share them copy-on-write"""
+    import production_cas
+    import similarity
+
+def post_worker_init(worker):
+    """Warm the topic-vector index in the background as each worker starts"""
+    from similarity import start_preload
+    start_preload()
@@ -4,58 +4,64 @@ Mock data that matches the actual topic_vectors table structure
 Used for development when CAS server is not accessible
 """
 
-import random
-import uuid
+import numpy as np
 
-def generate_mock_topic_vectors(num_rows=10):
+ASSIGNMENT_GROUPS = ["IT Support", "Network Team", "Database Team", "Security Team"]
+
+RESOLUTIONS = [
+    "Issue resolved by restarting the service",
+    "Configuration updated to resolve performance issue", 
+    "User access permissions corrected",
+    "Network connectivity restored",
+    "Database query optimized"
+]
+
+CONCERNS = [
+    "System performance degradation",
+    "User unable to access application",
+    "Database connection timeout",
+    "Network connectivity issues",
+    "Authentication failure"
+]
+
+DESCRIPTIONS = [
+    "User reported slow system response times during peak hours",
+    "Application throwing connection errors intermittently",
+    "Database queries taking longer than expected to execute",
+    "Users experiencing timeout errors when logging in",
+    "Network latency affecting application performance"
+]
+
+def generate_mock_topic_vectors(num_rows=10, seed=None):
     """
     Generate mock data matching the actual topic_vectors table structure
     Based on the columns seen in the SAS Data Explorer screenshot
+    
+    Every column is drawn in one vectorized call; seed makes the output repeatable
     """
-    mock_data = []
+    rng = np.random.default_rng(seed)
+    
+    columns = {
+        "__uniqueid__": [f"{value:08x}" for value in rng.integers(0, 2 ** 32, num_rows).tolist()],
+        "Case Number": [f"CS{10000000 + i}" for i in range(num_rows)],
+        "Assignment Group": np.array(ASSIGNMENT_GROUPS)[rng.integers(0, len(ASSIGNMENT_GROUPS), num_rows)].tolist(),
+        "Resolution": np.array(RESOLUTIONS)[rng.integers(0, len(RESOLUTIONS), num_rows)].tolist(),
+        "Concern": np.array(CONCERNS)[rng.integers(0, len(CONCERNS), num_rows)].tolist(),
+        "Description": np.array(DESCRIPTIONS)[rng.integers(0, len(DESCRIPTIONS), num_rows)].tolist()
+    }
+    
+    # Topic vectors - realistic values between 0 and 1
+    topics = rng.uniform(0.1, 0.9, (num_rows, 5)).round(4)
+    for j in range(5):
+        columns[f"_TextTopic_{j + 1}"] = topics[:, j].tolist()
     
-    for i in range(num_rows):
-        row = {
-            "__uniqueid__": str(uuid.uuid4())[:8],
-            "Case Number": f"CS{10000000 + i}",
-            "Assignment Group": random.choice(["IT Support", "Network Team", "Database Team", "Security Team"]),
-            "Resolution": random.choice([
-                "Issue resolved by restarting the service",
-                "Configuration updated to resolve performance issue", 
-                "User access permissions corrected",
-                "Network connectivity restored",
-                "Database query optimized"
-            ]),
-            "Concern": random.choice([
-                "System performance degradation",
-                "User unable to access application",
-                "Database connection timeout",
-                "Network connectivity issues",
-                "Authentication failure"
-            ]),
-            "Description": random.choice([
-                "User reported slow system response times during peak hours",
-                "Application throwing connection errors intermittently",
-                "Database queries taking longer than expected to execute",
-                "Users experiencing timeout errors when logging in",
-                "Network latency affecting application performance"
-            ]),
-            # Topic vectors - realistic values between 0 and 1
-            "_TextTopic_1": round(random.uniform(0.1, 0.9), 4),
-            "_TextTopic_2": round(random.uniform(0.1, 0.9), 4),
-            "_TextTopic_3": round(random.uniform(0.1, 0.9), 4),
-            "_TextTopic_4": round(random.uniform(0.1, 0.9), 4),
-            "_TextTopic_5": round(random.uniform(0.1, 0.9), 4),
-            # Additional columns
-            "_Col1_": round(random.uniform(0.0, 1.0), 4),
-            "_Col2_": round(random.uniform(0.0, 1.0), 4),
-            "_Col3_": round(random.uniform(0.0, 1.0), 4),
-            "_Col4_": round(random.uniform(0.0, 1.0), 4),
-            "_Col5_": round(random.uniform(0.0, 1.0), 4)
-        }
-        mock_data.append(row)
+    # Additional columns
+    extra = rng.uniform(0.0, 1.0, (num_rows, 5)).round(4)
+    for j in range(5):
+        columns[f"_Col{j + 1}_"] = extra[:, j].tolist()
     
-    return mock_data
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*columns.values())]
 
 def get_sample_case_numbers():
     """Get list of sample case numbers for testing"""
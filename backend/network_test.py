@@ -4,17 +4,29 @@ Network connectivity test for SAS Viya server
 Tests if Replit can reach the external SAS server
 """
 
+import functools
 import socket
 import requests
 import time
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+
+# Pooled keep-alive session so repeated probes reuse the TCP and TLS connection
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=10))
+
+@functools.lru_cache(maxsize=None)
+def resolve_host(hostname):
+    """Resolve hostname once per process; later probes reuse the address"""
+    return socket.gethostbyname(hostname)
 
 def test_tcp_connection(host, port, timeout=10):
     """Test TCP connection to host:port"""
     try:
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.settimeout(timeout)
-        result = sock.connect_ex((host, port))
+        result = sock.connect_ex((resolve_host(host), port))
         sock.close()
         return result == 0
     except Exception as e:
@@ -22,23 +34,39 @@ def test_tcp_connection(host, port, timeout=10):
         return False
 
 def test_http_connection(url, timeout=10):
-    """Test HTTP/HTTPS connection"""
+    """
+    Test HTTP/HTTPS connection
+    Returns 'SUCCESS', 'TLS_FAILED' when the server's certificate cannot be
+    verified, or 'FAILED'
+    """
     try:
-        response = requests.get(url, timeout=timeout, verify=False)
-        return response.status_code < 500
+        # Only the status line is needed, so the body is never downloaded
+        with _SESSION.get(url, timeout=timeout, stream=True) as response:
+            return 'SUCCESS' if response.status_code < 500 else 'FAILED'
+    except requests.exceptions.SSLError as e:
+        print(f"HTTP test TLS error: {e}")
+        return 'TLS_FAILED'
     except Exception as e:
         print(f"HTTP test error: {e}")
-        return False
+        return 'FAILED'
 
 def test_dns_resolution(hostname):
     """Test DNS resolution"""
     try:
-        socket.gethostbyname(hostname)
+        resolve_host(hostname)
         return True
     except Exception as e:
         print(f"DNS resolution error: {e}")
         return False
 
+def sasurl_reachable(sasurl, timeout=5):
+    """
+    Test that the host in a SASPy sasurl resolves and accepts a TCP connection
+    Diagnostic scripts check this first so they skip quickly without network access
+    """
+    url = urlparse(sasurl)
+    return test_dns_resolution(url.hostname) and test_tcp_connection(url.hostname, url.port or 443, timeout)
+
 def main():
     """Run connectivity tests for SAS Viya server"""
     host = "trck1056928.trc.sas.com"
@@ -57,15 +85,21 @@ def main():
         print("   Cannot resolve hostname. Server may not be accessible from Replit.")
         return False
     
-    # Test 2: HTTPS Connection
-    print(f"2. Testing HTTPS connection to {https_url}...")
-    https_ok = test_http_connection(https_url)
-    print(f"   Result: {'SUCCESS' if https_ok else 'FAILED'}")
-    
-    # Test 3: CAS Port Connection
-    print(f"3. Testing CAS port connection to {host}:{cas_port}...")
-    cas_ok = test_tcp_connection(host, cas_port)
-    print(f"   Result: {'SUCCESS' if cas_ok else 'FAILED'}")
+    # Tests 2 and 3 are independent, so both probes run at once
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        https_future = executor.submit(test_http_connection, https_url)
+        cas_future = executor.submit(test_tcp_connection, host, cas_port)
+        
+        # Test 2: HTTPS Connection
+        print(f"2. Testing HTTPS connection to {https_url}...")
+        https_status = https_future.result()
+        https_ok = https_status == 'SUCCESS'
+        print(f"   Result: {https_status}")
+        
+        # Test 3: CAS Port Connection
+        print(f"3. Testing CAS port connection to {host}:{cas_port}...")
+        cas_ok = cas_future.result()
+        print(f"   Result: {'SUCCESS' if cas_ok else 'FAILED'}")
     
     # Summary
     print("\n" + "=" * 60)
@@ -75,6 +109,9 @@ def main():
     if dns_ok and https_ok and cas_ok:
         print("✓ Full connectivity - CAS integration should work")
         return True
+    elif https_status == 'TLS_FAILED':
+        print("⚠ Server reachable but its TLS certificate is not trusted - set REQUESTS_CA_BUNDLE to the SAS CA bundle")
+        return False
     elif dns_ok and https_ok:
         print("⚠ HTTPS works but CAS port blocked - May need VPN or firewall configuration")
         return False
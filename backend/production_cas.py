@@ -6,7 +6,10 @@ Connects to trck1056928.trc.sas.com using sasboot credentials
 
 import os
 import json
+import atexit
 import logging
+import threading
+import time
 from typing import Dict, List, Optional, Any
 from dotenv import load_dotenv
 
@@ -15,6 +18,15 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Seconds between keep-alive pings on the shared CAS session
+CAS_KEEPALIVE_SECONDS = int(os.getenv('CAS_KEEPALIVE_SECONDS', 60))
+
+# Single CAS session reused across requests; a session runs one action at a
+# time, so calls on it are serialized
+_cas_conn = None
+_cas_lock = threading.RLock()
+_keepalive_thread = None
+
 class CASConnectionError(Exception):
     """Custom exception for CAS connection issues"""
     pass
@@ -31,7 +43,7 @@ def connect_to_cas():
         cas_username = os.getenv('CAS_USERNAME', 'sasboot')
         cas_password = os.getenv('CAS_PASSWORD', 'Orion123')
         
-        logger.info(f"Connecting to CAS server: {cas_host}:{cas_port}")
+        logger.info("Connecting to CAS server: %s:%s", cas_host, cas_port)
         
         # Create CAS connection
         conn = swat.CAS(
@@ -44,7 +56,7 @@ def connect_to_cas():
         
         # Verify connection
         about_info = conn.about()
-        logger.info(f"Connected to CAS server version: {about_info.get('About', {}).get('Version', 'Unknown')}")
+        logger.info("Connected to CAS server version: %s", about_info.get('About', {}).get('Version', 'Unknown'))
         
         return conn
         
@@ -62,55 +74,149 @@ def connect_to_cas():
     except Exception as e:
         raise CASConnectionError(f"Failed to connect to CAS server {cas_host}:{cas_port} - {str(e)}")
 
-def load_topic_vectors_preview(rows: int = 5) -> List[Dict[str, Any]]:
+def get_cas_connection():
     """
-    Load preview data from topic_vectors table in casuser library
+    Return the shared CAS session, connecting on first use
+    """
+    global _cas_conn
+    with _cas_lock:
+        if _cas_conn is None:
+            _cas_conn = connect_to_cas()
+            _start_keepalive()
+        return _cas_conn
+
+def reset_cas_connection():
+    """
+    Close the shared CAS session so the next call reconnects
+    """
+    global _cas_conn
+    with _cas_lock:
+        if _cas_conn is not None:
+            try:
+                _cas_conn.close()
+            except Exception:
+                pass
+            _cas_conn = None
+
+def _run_with_connection(operation):
+    """
+    Run operation(conn) on the shared session, reconnecting once if it fails
+    with a CAS or connection error; anything else propagates unchanged
+    """
+    with _cas_lock:
+        conn = get_cas_connection()
+        # swat is importable once a session exists (connect_to_cas installs it if needed)
+        import swat
+        try:
+            return operation(conn)
+        except (swat.SWATError, OSError) as e:
+            logger.warning("CAS call failed on shared session, reconnecting: %s", e)
+            reset_cas_connection()
+            return operation(get_cas_connection())
+
+def _keepalive_loop():
+    """Ping the shared session so it stays authenticated; drop it if the ping fails"""
+    while True:
+        time.sleep(CAS_KEEPALIVE_SECONDS)
+        with _cas_lock:
+            if _cas_conn is None:
+                continue
+            try:
+                _cas_conn.sessionStatus()
+            except Exception as e:
+                logger.warning("CAS keep-alive ping failed, reconnecting on next request: %s", e)
+                reset_cas_connection()
+
+def _start_keepalive():
+    """Start the keep-alive pinger once per process"""
+    global _keepalive_thread
+    if _keepalive_thread is None or not _keepalive_thread.is_alive():
+        _keepalive_thread = threading.Thread(target=_keepalive_loop, name='cas-keepalive', daemon=True)
+        _keepalive_thread.start()
+
+atexit.register(reset_cas_connection)
+
+def fetch_topic_vectors_preview(rows: int = 5):
+    """
+    Fetch the first rows of the topic_vectors table in casuser library
     
     Args:
         rows: Number of rows to return (default 5)
         
     Returns:
-        List of dictionaries representing table rows from your server
+        pandas DataFrame of table rows from your server
     """
-    conn = None
     try:
-        # Connect to your CAS server
-        conn = connect_to_cas()
-        
         # Access the topic_vectors table from casuser library
-        logger.info(f"Loading {rows} rows from casuser.topic_vectors")
+        logger.info("Loading %d rows from casuser.topic_vectors", rows)
         
-        # Load the table
-        topic_vectors = conn.CASTable('topic_vectors', caslib='casuser')
-        
-        # Get first N rows
-        result = topic_vectors.head(rows)
+        # Get first N rows over the shared session
+        result = _run_with_connection(
+            lambda conn: conn.CASTable('topic_vectors', caslib='casuser').head(rows)
+        )
         
         if result is None or len(result) == 0:
             raise CASConnectionError("No data returned from topic_vectors table")
         
-        # Convert to JSON-serializable format
-        data = result.to_dict('records')
-        
-        logger.info(f"Successfully loaded {len(data)} rows from topic_vectors")
-        return data
+        logger.info("Successfully loaded %d rows from topic_vectors", len(result))
+        return result
         
     except Exception as e:
         raise CASConnectionError(f"Error loading topic_vectors preview: {str(e)}")
-    finally:
-        if conn:
-            try:
-                conn.close()
-            except:
-                pass
 
-def test_cas_server_connection() -> Dict[str, Any]:
+def fetch_topic_vectors(keep=None):
     """
-    Test connection to your CAS server and return status
+    Fetch the whole topic_vectors table in casuser library over the shared session
+    
+    Args:
+        keep: Optional predicate on column names; only matching columns are transferred
+        
+    Returns:
+        pandas DataFrame of the table
     """
+    def _fetch(conn):
+        table = conn.CASTable('topic_vectors', caslib='casuser')
+        if keep is not None:
+            table = table[[col for col in table.columns if keep(col)]]
+        return table.to_frame()
+    
     try:
-        conn = connect_to_cas()
+        return _run_with_connection(_fetch)
+    except Exception as e:
+        raise CASConnectionError(f"Error loading topic_vectors: {str(e)}")
+
+def fetch_topic_vectors_stamp():
+    """
+    Modification time and row count of topic_vectors from tableInfo, a cheap
+    freshness check before transferring the table; None when unavailable
+    """
+    try:
+        info = _run_with_connection(
+            lambda conn: conn.tableInfo(caslib='casuser', name='topic_vectors')['TableInfo'].iloc[0]
+        )
+        return [str(info.get('ModTime')), str(info.get('Rows'))]
+    except Exception as e:
+        logger.warning("Could not read topic_vectors table info: %s", e)
+        return None
+
+def load_topic_vectors_preview(rows: int = 5) -> List[Dict[str, Any]]:
+    """
+    Load preview data from topic_vectors table in casuser library
+    
+    Args:
+        rows: Number of rows to return (default 5)
         
+    Returns:
+        List of dictionaries representing table rows from your server
+    """
+    # Convert to JSON-serializable format
+    return fetch_topic_vectors_preview(rows).to_dict('records')
+
+def test_cas_server_connection() -> Dict[str, Any]:
+    """
+    Test connection to your CAS server and return status
+    """
+    def _server_status(conn):
         # Get server information
         about_info = conn.about()
         session_info = conn.sessionStatus()
@@ -122,7 +228,11 @@ def test_cas_server_connection() -> Dict[str, Any]:
         except:
             table_count = 0
         
-        conn.close()
+        return about_info, session_info, table_count
+    
+    try:
+        # Reuses the live session; only a dead session pays for a new login
+        about_info, session_info, table_count = _run_with_connection(_server_status)
         
         return {
             "status": "success",
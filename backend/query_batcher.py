@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Request coalescing for similarity searches
+Concurrent callers are grouped into one batch so they share a single CAS
+round trip and one matrix multiply
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List
+
+class QueryBatcher:
+    """
+    Collect submitted queries for up to max_wait seconds (or max_batch items)
+    and resolve them together with one call to handler(list_of_queries)
+    """
+
+    def __init__(self, handler: Callable[[List[Any]], List[Any]],
+                 max_batch: int = 64, max_wait: float = 0.01):
+        self._handler = handler
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def submit(self, query: Any) -> Future:
+        """Queue a query and return a Future for its result"""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((query, future))
+        return future
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='query-batcher', daemon=True)
+                self._worker.start()
+
+    def _next_batch(self) -> List[Any]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                results = self._handler([query for query, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            results = list(results)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+            # A short result list must not leave callers waiting forever
+            for _, future in batch[len(results):]:
+                future.set_exception(RuntimeError(
+                    f"Batch handler returned {len(results)} results for {len(batch)} queries"))
@@ -4,9 +4,8 @@ Standalone script to run the Flask backend server
 """
 import sys
 import os
+import importlib.util
 import logging
-from app import app
-from config import Config
 
 # Configure logging
 logging.basicConfig(
@@ -18,13 +17,12 @@ logger = logging.getLogger(__name__)
 
 def check_dependencies():
     """Check if all required dependencies are installed"""
-    required_packages = ['flask', 'flask_cors', 'saspy', 'sklearn', 'pandas', 'numpy']
+    required_packages = ['flask', 'flask_cors', 'saspy', 'pandas', 'numpy']
     missing_packages = []
     
+    # find_spec locates each package without executing its __init__
     for package in required_packages:
-        try:
-            __import__(package)
-        except ImportError:
+        if importlib.util.find_spec(package) is None:
             missing_packages.append(package)
     
     if missing_packages:
@@ -41,6 +39,23 @@ def main():
         if not check_dependencies():
             sys.exit(1)
         
+        from config import Config
+        
+        # Outside debug mode, replace this process with gunicorn using
+        # gunicorn.conf.py (gthread workers forked from a preloaded app)
+        if not Config.FLASK_DEBUG and all(importlib.util.find_spec(pkg) for pkg in ('gunicorn',)):
+            backend_dir = os.path.dirname(os.path.abspath(__file__))
+            logger.info(f"Starting CaseMatch under gunicorn on http://{Config.FLASK_HOST}:{Config.FLASK_PORT}")
+            os.execv(sys.executable, [
+                sys.executable, '-m', 'gunicorn',
+                '--chdir', backend_dir,
+                '-c', os.path.join(backend_dir, 'gunicorn.conf.py'),
+                'app:app'
+            ])
+        
+        # Imported only once dependencies are confirmed; app pulls in Flask and the CAS stack
+        from app import app
+        
         logger.info("Starting CaseMatch Flask Backend Server")
         logger.info(f"Server will run on: http://{Config.FLASK_HOST}:{Config.FLASK_PORT}")
         logger.info(f"Debug mode: {Config.FLASK_DEBUG}")
@@ -6,7 +6,11 @@ Use this script when running on your local machine with SAS Viya access
 
 import os
 import sys
+import json
+import time
+import socket
 import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from pathlib import Path
 
 # Set up logging
@@ -17,15 +21,60 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Successful lookups are remembered across restarts for DNS_CACHE_SECONDS
+DNS_CACHE_PATH = Path.home() / '.casematch_dns_cache.json'
+DNS_CACHE_SECONDS = 900
+DNS_TIMEOUT_SECONDS = 2
+
+def _cached_address(hostname):
+    """Return the cached address for hostname if it was resolved recently"""
+    try:
+        entry = json.loads(DNS_CACHE_PATH.read_text()).get(hostname)
+    except (OSError, ValueError):
+        return None
+    if entry and time.time() - entry['resolved_at'] < DNS_CACHE_SECONDS:
+        return entry['address']
+    return None
+
+def resolve_host(hostname):
+    """
+    Resolve hostname, using the on-disk cache when fresh and giving up after
+    DNS_TIMEOUT_SECONDS so a slow resolver cannot stall startup
+    
+    Raises socket.gaierror if the name does not resolve in time.
+    """
+    address = _cached_address(hostname)
+    if address is not None:
+        return address
+    
+    # getaddrinfo ignores socket timeouts, so wait on it from a helper thread
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        infos = executor.submit(socket.getaddrinfo, hostname, None, socket.AF_INET).result(DNS_TIMEOUT_SECONDS)
+    except FutureTimeout:
+        raise socket.gaierror(f"Timed out resolving {hostname}")
+    finally:
+        executor.shutdown(wait=False)
+    address = infos[0][4][0]
+    
+    try:
+        try:
+            cache = json.loads(DNS_CACHE_PATH.read_text())
+        except (OSError, ValueError):
+            cache = {}
+        cache[hostname] = {'address': address, 'resolved_at': time.time()}
+        DNS_CACHE_PATH.write_text(json.dumps(cache))
+    except OSError as e:
+        logger.debug(f"Could not write DNS cache: {e}")
+    return address
+
 def check_environment():
     """Check if running environment is suitable for SAS Viya connection"""
     try:
-        import socket
-        
         # Try to resolve SAS Viya hostname
         hostname = "trck1056928.trc.sas.com"
         try:
-            socket.gethostbyname(hostname)
+            resolve_host(hostname)
             logger.info(f"✓ SAS Viya hostname {hostname} is resolvable")
             return True
         except socket.gaierror:
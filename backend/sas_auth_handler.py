@@ -6,33 +6,99 @@ Handles modern SAS Viya authentication with OAuth2 flows
 
 import os
 import json
+import hashlib
+import time
+import atexit
 import logging
+import threading
 from typing import Dict, Any, Optional
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+# Tokens count as expired this many seconds before the server's expiry
+TOKEN_EXPIRY_MARGIN = 300
+# Lifetime assumed when the token response carries no expires_in
+DEFAULT_TOKEN_LIFETIME = 3600
+
+# OAuth2 tokens shared by every handler in the process, keyed by
+# token_cache_key; an empty dict records that there is no usable token
+_token_cache: Dict[str, Dict] = {}
+_token_lock = threading.Lock()
+
+# One authenticated SASPy session reused across requests
+_sas_session = None
+_session_last_used = 0.0
+_session_lock = threading.Lock()
+
+# A session idle for longer than this must answer a probe before it is reused
+SESSION_IDLE_PROBE_SECONDS = 60
+
+def token_cache_key(user: str) -> str:
+    """
+    SHA-256 of the SAS host, user and OAuth client id, so a token is never
+    reused for a different user, client or server
+    """
+    from config import Config
+    
+    client_id = Config.get_sas_config()['client_id']
+    return hashlib.sha256(f"{Config.SAS_HOST}|{user}|{client_id}".encode()).hexdigest()
+
+def invalidate(user: str):
+    """Forget user's cached token, e.g. after the server rejects it before expiry"""
+    with _token_lock:
+        _token_cache[token_cache_key(user)] = {}
+
 class SASVilyaAuthHandler:
     """Handle SAS Viya authentication including OAuth2 flows"""
     
     def __init__(self):
-        self.auth_cache_file = os.path.join(os.path.dirname(__file__), '.sas_auth_cache.json')
-        self.cached_auth = self._load_cached_auth()
+        from config import Config
+        
+        self.user = Config.SAS_USERNAME
+        self.cache_key = token_cache_key(self.user)
+        self.auth_cache_file = os.path.join(os.path.dirname(__file__), f'.sas_auth_cache_{self.cache_key}.json')
+    
+    @property
+    def cached_auth(self) -> Optional[Dict]:
+        """The user's unexpired token data, read from disk only on the first lookup"""
+        with _token_lock:
+            auth = _token_cache.get(self.cache_key)
+            if auth is None:
+                auth = _token_cache[self.cache_key] = self._load_cached_auth() or {}
+        
+        if 'access_token' in auth and time.time() < auth.get('expires_at', 0):
+            return auth
+        return None
     
     def _load_cached_auth(self) -> Optional[Dict]:
         """Load cached authentication tokens if available"""
         try:
             if os.path.exists(self.auth_cache_file):
-                with open(self.auth_cache_file, 'r') as f:
-                    return json.load(f)
+                with open(self.auth_cache_file, 'rb') as f:
+                    data = f.read()
+                return orjson.loads(data) if orjson is not None else json.loads(data)
         except Exception as e:
             logger.warning(f"Could not load cached auth: {e}")
         return None
     
     def _save_auth_cache(self, auth_data: Dict):
-        """Save authentication data for reuse"""
+        """Save authentication data for reuse, stamped with its expiry time"""
+        lifetime = auth_data.get('expires_in', DEFAULT_TOKEN_LIFETIME)
+        auth_data = dict(auth_data, expires_at=time.time() + lifetime - TOKEN_EXPIRY_MARGIN)
+        with _token_lock:
+            _token_cache[self.cache_key] = auth_data
+        
         try:
-            with open(self.auth_cache_file, 'w') as f:
-                json.dump(auth_data, f)
+            # Write then rename so a crash never leaves a half-written cache
+            tmp_path = f'{self.auth_cache_file}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(orjson.dumps(auth_data) if orjson is not None else json.dumps(auth_data).encode())
+            os.replace(tmp_path, self.auth_cache_file)
         except Exception as e:
             logger.warning(f"Could not save auth cache: {e}")
     
@@ -43,7 +109,8 @@ class SASVilyaAuthHandler:
         base_config = {
             'url': f'https://{Config.SAS_HOST}',
             'context': 'SAS Studio compute context',
-            'options': ['-fullstimer'],
+            # Per-step resource logging only when profiling
+            'options': ['-fullstimer'] if os.getenv('SAS_FULLSTIMER', 'false').lower() == 'true' else [],
             'encoding': 'utf8'
         }
         
@@ -57,16 +124,17 @@ class SASVilyaAuthHandler:
     
     def _try_oauth2_config(self, base_config: Dict) -> Optional[Dict]:
         """Try OAuth2 authentication configuration"""
-        if self.cached_auth and 'access_token' in self.cached_auth:
+        cached_auth = self.cached_auth
+        if cached_auth:
             logger.info("Using cached OAuth2 authentication")
             config = base_config.copy()
             config.update({
                 'authkey': 'oauth',
-                'access_token': self.cached_auth['access_token']
+                'access_token': cached_auth['access_token']
             })
             
-            if 'refresh_token' in self.cached_auth:
-                config['refresh_token'] = self.cached_auth['refresh_token']
+            if 'refresh_token' in cached_auth:
+                config['refresh_token'] = cached_auth['refresh_token']
             
             return config
         
@@ -95,6 +163,7 @@ class SASVilyaAuthHandler:
     
     def clear_auth_cache(self):
         """Clear cached authentication data"""
+        invalidate(self.user)
         try:
             if os.path.exists(self.auth_cache_file):
                 os.remove(self.auth_cache_file)
@@ -102,7 +171,53 @@ class SASVilyaAuthHandler:
         except Exception as e:
             logger.warning(f"Could not clear auth cache: {e}")
 
+def _session_alive(sas) -> bool:
+    """
+    True while the session still has a SAS process behind it; after
+    SESSION_IDLE_PROBE_SECONDS idle it must also answer a SYSERR() round
+    trip, which catches a server-side session that expired or was killed
+    """
+    if sas is None or getattr(sas, 'SASpid', None) is None:
+        return False
+    if time.monotonic() - _session_last_used <= SESSION_IDLE_PROBE_SECONDS:
+        return True
+    
+    try:
+        sas.SYSERR()
+    except Exception as e:
+        logger.warning(f"Idle SAS session failed its probe, reconnecting: {e}")
+        return False
+    return getattr(sas, 'SASpid', None) is not None
+
 def get_sas_session_with_auth():
+    """Return the shared SAS session, authenticating only when there is no live one"""
+    global _sas_session, _session_last_used
+    with _session_lock:
+        if not _session_alive(_sas_session):
+            if _sas_session is not None:
+                try:
+                    _sas_session.endsas()
+                except Exception:
+                    pass
+                _sas_session = None
+            _sas_session = _connect_sas_session()
+        _session_last_used = time.monotonic()
+        return _sas_session
+
+def close_session():
+    """End the shared SAS session so the next call reconnects"""
+    global _sas_session
+    with _session_lock:
+        if _sas_session is not None:
+            try:
+                _sas_session.endsas()
+            except Exception:
+                pass
+            _sas_session = None
+
+atexit.register(close_session)
+
+def _connect_sas_session():
     """Create SAS session with proper authentication handling"""
     import saspy
     
@@ -127,16 +242,22 @@ def get_sas_session_with_auth():
             raise
 
 if __name__ == "__main__":
-    # Test authentication handler
-    try:
-        sas = get_sas_session_with_auth()
-        if sas:
-            print("✓ SAS connection successful")
-            result = sas.submit("proc options option=work; run;")
-            if result and 'ERROR' not in result.get('LOG', ''):
-                print("✓ SAS session working")
-            sas.endsas()
-        else:
-            print("✗ Connection failed")
-    except Exception as e:
-        print(f"✗ Error: {e}")
\ No newline at end of file
+    from network_test import sasurl_reachable
+    from sascfg_personal import viya
+    
+    # Test authentication handler, skipping straight away when the host is unreachable
+    if not sasurl_reachable(viya['sasurl']):
+        print("⚠ SKIP: SAS Viya host unreachable")
+    else:
+        try:
+            sas = get_sas_session_with_auth()
+            if sas:
+                print("✓ SAS connection successful")
+                result = sas.submit("proc options option=work; run;")
+                if result and 'ERROR' not in result.get('LOG', ''):
+                    print("✓ SAS session working")
+                close_session()
+            else:
+                print("✗ Connection failed")
+        except Exception as e:
+            print(f"✗ Error: {e}")
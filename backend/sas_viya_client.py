@@ -7,14 +7,28 @@ Connects to trck1056928.trc.sas.com with sasboot credentials
 import os
 import sys
 import json
+import time
 import logging
 from typing import Dict, List, Optional, Any
 from pathlib import Path
 
+import numpy as np
+
+from ttl_cache import TTLCache
+from vector_search import (RESULT_COLUMNS, TopicMatrix, case_results, cosine_topk_query,
+                           ranked_results, result_records, top_k_indices, topic_columns,
+                           where_literal)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Seconds the in-memory topic matrix is reused before it is fetched again
+MATRIX_TTL_SECONDS = int(os.getenv('MATRIX_TTL_SECONDS', 600))
+
+# A session idle for longer than this is pinged before it is reused
+CAS_IDLE_PING_SECONDS = 60
+
 class SASVilyaClient:
     """Client for connecting to your SAS Viya server"""
     
@@ -24,6 +38,20 @@ class SASVilyaClient:
         self.username = 'sasboot'
         self.password = 'Orion123'
         self.connection = None
+        self._last_used = 0.0
+        # Ranked results for repeat lookups of hot cases
+        self._results = TTLCache(maxsize=1024, ttl=600)
+        # topic_vectors' _TextTopic_* columns and every column a search reads,
+        # looked up again whenever the matrix is reloaded
+        self._topic_cols = None
+        self._needed_cols = None
+        # Every topic vector as one quantized matrix, its case index and the
+        # result columns, fetched once per MATRIX_TTL_SECONDS
+        self._topic_matrix = None
+        self._case_index = {}
+        self._records = []
+        self._matrix_loaded_at = 0.0
+        self._searches = 0
         
     def connect(self) -> bool:
         """Establish connection to your CAS server"""
@@ -61,19 +89,61 @@ class SASVilyaClient:
             logger.error(f"Connection failed: {e}")
             return False
     
+    def _ensure_connection(self) -> bool:
+        """
+        Connect if there is no session; a session idle for CAS_IDLE_PING_SECONDS
+        is pinged first and replaced if it has dropped
+        """
+        if self.connection is not None and time.time() - self._last_used > CAS_IDLE_PING_SECONDS:
+            try:
+                self.connection.sessionStatus()
+            except Exception as e:
+                logger.warning(f"CAS session went stale, reconnecting: {e}")
+                self.close()
+                self.invalidate_matrix()
+        
+        if self.connection is None and not self.connect():
+            return False
+        
+        self._last_used = time.time()
+        return True
+    
+    def _call(self, operation):
+        """
+        Run operation() on the session, reconnecting and retrying once if it
+        fails with a CAS or connection error; the retry re-reads topic_vectors'
+        columns in case the failure came from a schema change. Any other
+        exception is a bug in the caller and propagates unchanged.
+        """
+        import swat
+        
+        try:
+            return operation()
+        except (swat.SWATError, OSError) as e:
+            logger.warning(f"CAS call failed, reconnecting: {e}")
+            self.close()
+            self.invalidate_matrix()
+            if not self.connect():
+                raise
+            return operation()
+    
+    def _topic_vectors(self):
+        """topic_vectors on the current session"""
+        return self.connection.CASTable('topic_vectors', caslib='casuser')
+    
     def get_server_status(self) -> Dict[str, Any]:
         """Get server status and connection information"""
-        if not self.connection:
-            if not self.connect():
-                return {
-                    "status": "connection_failed",
-                    "error": "Cannot establish connection to CAS server",
-                    "message": "Requires VPN access to trck1056928.trc.sas.com"
-                }
+        if not self._ensure_connection():
+            return {
+                "status": "connection_failed",
+                "error": "Cannot establish connection to CAS server",
+                "message": "Requires VPN access to trck1056928.trc.sas.com"
+            }
         
         try:
-            about_info = self.connection.about()
-            session_info = self.connection.sessionStatus()
+            about_info, session_info = self._call(
+                lambda: (self.connection.about(), self.connection.sessionStatus())
+            )
             
             # Check casuser library access
             try:
@@ -100,16 +170,12 @@ class SASVilyaClient:
     
     def load_topic_vectors(self, rows: int = 5) -> List[Dict[str, Any]]:
         """Load data from topic_vectors table in casuser library"""
-        if not self.connection:
-            if not self.connect():
-                return []
+        if not self._ensure_connection():
+            return []
         
         try:
-            # Access topic_vectors table
-            topic_vectors = self.connection.CASTable('topic_vectors', caslib='casuser')
-            
-            # Get sample data
-            result = topic_vectors.head(rows)
+            # Get sample data from the topic_vectors table
+            result = self._call(lambda: self._topic_vectors().head(rows))
             
             if result is None or len(result) == 0:
                 logger.warning("No data returned from topic_vectors table")
@@ -127,80 +193,137 @@ class SASVilyaClient:
     
     def find_similar_cases(self, case_number: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """Find similar cases using topic vectors"""
-        if not self.connection:
-            if not self.connect():
-                return []
+        if not self._ensure_connection():
+            return []
+        
+        cached = self._results.get((case_number, top_k))
+        if cached is not None:
+            return [dict(case) for case in cached]
         
         try:
-            # Load topic_vectors table
-            topic_vectors = self.connection.CASTable('topic_vectors', caslib='casuser')
+            # Until the matrix has been pulled once, the first search is ranked
+            # inside CAS so only top_k rows cross the network
+            self._searches += 1
+            if self._topic_matrix is None and self._searches == 1:
+                similar_cases = self._call(lambda: self._rank_target_in_cas(case_number, top_k))
+                if similar_cases is not None:
+                    self._results.set((case_number, top_k), similar_cases)
+                    return [dict(case) for case in similar_cases]
             
-            # Find the target case
-            target_case = topic_vectors.query(f'"Case Number" = "{case_number}"')
+            if not self._call(self._ensure_matrix):
+                return []
             
-            if len(target_case) == 0:
+            target_idx = self._case_index.get(case_number)
+            if target_idx is None:
                 logger.warning(f"Case {case_number} not found in topic_vectors")
                 return []
             
-            # Get target case vector
-            target_vector = target_case.iloc[0]
-            
-            # Extract topic vector columns
-            topic_cols = [col for col in target_case.columns if col.startswith('_TextTopic_')]
-            
-            if not topic_cols:
-                logger.warning("No topic vector columns found")
+            # An all-zero vector is similar to nothing
+            if not self._topic_matrix.norms[target_idx]:
                 return []
             
-            # Calculate similarity with all other cases
-            # This is a simplified approach - in production you'd use CAS analytics
-            all_cases = topic_vectors.query(f'"Case Number" != "{case_number}"')
-            
-            similar_cases = []
-            for _, row in all_cases.head(50).iterrows():  # Limit for performance
-                # Calculate cosine similarity
-                similarity = self._calculate_similarity(
-                    [target_vector[col] for col in topic_cols],
-                    [row[col] for col in topic_cols]
-                )
-                
-                similar_cases.append({
-                    "case_number": row.get("Case Number", ""),
-                    "similarity_score": round(similarity, 4),
-                    "title": row.get("Description", "")[:100],
-                    "resolution": row.get("Resolution", "")[:100],
-                    "assignment_group": row.get("Assignment Group", ""),
-                    "case_type": row.get("Concern", ""),
-                    "status": "resolved"
-                })
-            
-            # Sort by similarity and return top K
-            similar_cases.sort(key=lambda x: x["similarity_score"], reverse=True)
-            return similar_cases[:top_k]
+            # Score every other case in one vectorized pass, then select the
+            # top K with argpartition rather than sorting all N scores
+            scores = self._topic_matrix.row_similarities(target_idx)
+            top = top_k_indices(scores, top_k, exclude=target_idx)
+            similar_cases = ranked_results(self._records, top, scores[top])
+            self._results.set((case_number, top_k), similar_cases)
+            return [dict(case) for case in similar_cases]
             
         except Exception as e:
             logger.error(f"Error finding similar cases: {e}")
             return []
     
-    def _calculate_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """Calculate cosine similarity between two vectors"""
+    def _table_columns(self, topic_vectors) -> List[str]:
+        """Return the topic columns, introspecting topic_vectors on first use"""
+        if self._topic_cols is None:
+            columns = list(topic_vectors.columns)
+            self._topic_cols = topic_columns(columns)
+            self._needed_cols = (['Case Number'] + self._topic_cols +
+                                 [col for col in RESULT_COLUMNS[1:] if col in columns])
+        return self._topic_cols
+    
+    def _ensure_matrix(self) -> bool:
+        """
+        Fetch every topic vector into the in-memory matrix unless it is younger
+        than MATRIX_TTL_SECONDS; returns whether a matrix is available
+        """
+        if self._topic_matrix is not None and time.time() - self._matrix_loaded_at < MATRIX_TTL_SECONDS:
+            return True
+        
+        # Columns are looked up afresh with each reload to pick up schema changes
+        self.invalidate_matrix()
+        topic_vectors = self._topic_vectors()
+        topic_cols = self._table_columns(topic_vectors)
+        if not topic_cols:
+            logger.warning("No topic vector columns found")
+            return False
+        
+        # One scan, projected to the key, topic and result columns; rows are
+        # held as int8 codes with per-row scales, a quarter of the float32 bytes
+        frame = topic_vectors[self._needed_cols].to_frame()
+        self._topic_matrix = TopicMatrix(np.array(frame[topic_cols], dtype=np.float32, order='C'),
+                                         precision='int8')
+        self._case_index = {case: idx for idx, case in enumerate(frame['Case Number'].astype(str))}
+        # Result fields per row, built once so a search is just index lookups
+        self._records = result_records(frame)
+        self._matrix_loaded_at = time.time()
+        logger.info(f"Cached {len(frame)} topic vectors ({len(topic_cols)} topics)")
+        return True
+    
+    def invalidate_matrix(self):
+        """
+        Drop the cached matrix, column lists and results so the next search
+        reads topic_vectors and its schema again
+        """
+        self._topic_matrix = None
+        self._topic_cols = None
+        self._needed_cols = None
+        self._results.clear()
+    
+    def _rank_target_in_cas(self, case_number: str, top_k: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Fetch the target's topic vector and rank it inside CAS; returns None
+        when the search should score locally
+        """
+        topic_vectors = self._topic_vectors()
+        topic_cols = self._table_columns(topic_vectors)
+        if not topic_cols:
+            return None
+        
+        # Only the target's topic columns cross the wire
+        target_case = topic_vectors.query(f'"Case Number" = {where_literal(case_number)}')[topic_cols].head(1)
+        if len(target_case) == 0:
+            logger.warning(f"Case {case_number} not found in topic_vectors")
+            return []
+        
+        target = np.array(target_case, dtype=np.float32)[0]
+        # An all-zero vector is similar to nothing; skip the ranking query
+        if not np.any(target):
+            return []
+        
+        return self._rank_in_cas(topic_cols, target, case_number, top_k)
+    
+    def _rank_in_cas(self, topic_cols: List[str], target: np.ndarray,
+                     case_number: str, top_k: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Score every case with one FedSQL query on the server and return the
+        top_k results, or None if FedSQL is unavailable
+        """
+        query = cosine_topk_query('CASUSER.TOPIC_VECTORS', topic_cols, target,
+                                  case_number, RESULT_COLUMNS, top_k)
         try:
-            import math
-            
-            # Calculate dot product
-            dot_product = sum(a * b for a, b in zip(vec1, vec2))
-            
-            # Calculate magnitudes
-            magnitude1 = math.sqrt(sum(a * a for a in vec1))
-            magnitude2 = math.sqrt(sum(a * a for a in vec2))
-            
-            if magnitude1 == 0 or magnitude2 == 0:
-                return 0.0
-            
-            return dot_product / (magnitude1 * magnitude2)
-            
-        except Exception:
-            return 0.0
+            self.connection.loadactionset('fedSql')
+            result = self.connection.fedSql.execDirect(query=query)
+        except Exception as e:
+            logger.warning(f"FedSQL ranking failed, scoring locally: {e}")
+            return None
+        
+        if 'Result Set' not in result:
+            return None
+        
+        ranked = result['Result Set']
+        return case_results(ranked, ranked['similarity_score'].to_numpy())
     
     def close(self):
         """Close the CAS connection"""
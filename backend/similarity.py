@@ -1,20 +1,120 @@
-import saspy
+import importlib.util
+import json
 import pandas as pd
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import os
 import logging
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from query_batcher import QueryBatcher
+from vector_search import TopicMatrix
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# On-disk snapshot of topic_vectors shared by every worker process
+VECTOR_CACHE_DIR = os.getenv('VECTOR_CACHE_DIR', os.path.join(os.path.dirname(__file__), '.vector_cache'))
+VECTOR_REFRESH_SECONDS = int(os.getenv('VECTOR_REFRESH_SECONDS', 900))
+# File naming the published snapshot directory inside VECTOR_CACHE_DIR; its
+# mtime is the snapshot's freshness
+SNAPSHOT_POINTER = os.path.join(VECTOR_CACHE_DIR, 'current')
+# Seconds a search waits for an in-flight index load before giving up
+PRELOAD_WAIT_SECONDS = float(os.getenv('PRELOAD_WAIT_SECONDS', 60))
+# Seconds a search waits for its batched result
+SEARCH_TIMEOUT_SECONDS = 60
+
+# Metadata columns tried, in order, for each result field, and the value used when none exist
+RESULT_FIELD_SOURCES = {
+    'case_number': (['Case Number', 'case_number'], 'Unknown'),
+    'resolution': (['Resolution', 'resolution'], 'No resolution available'),
+    'title': (['Description', 'Concern', 'description'], 'No description available'),
+    'assignment_group': (['Assignment Group', 'assignment_group'], 'Unknown'),
+    'case_type': (['case_type'], 'Unknown'),
+    'status': (['status'], 'Unknown')
+}
+RESULT_FIELD_ORDER = ['case_number', 'similarity_score', 'resolution', 'title',
+                      'assignment_group', 'case_type', 'status']
+
+# Column prefixes holding topic vector components
+VECTOR_COLUMN_PREFIXES = ('_TextTopic_', '_Col')
+
+def _index_column(column: str) -> bool:
+    """True for the columns the vector index keeps: vectors plus result metadata"""
+    return column.startswith(VECTOR_COLUMN_PREFIXES) or any(
+        column in columns for columns, _ in RESULT_FIELD_SOURCES.values())
+
+@contextmanager
+def _snapshot_build_lock():
+    """
+    Exclusive lock on VECTOR_CACHE_DIR shared by every worker process, so only
+    one of them rebuilds the snapshot at a time; a no-op without fcntl
+    """
+    if fcntl is None:
+        yield
+        return
+
+    os.makedirs(VECTOR_CACHE_DIR, exist_ok=True)
+    with open(os.path.join(VECTOR_CACHE_DIR, '.build.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _current_snapshot_dir() -> Optional[str]:
+    """Directory of the published snapshot, or None before the first build"""
+    try:
+        with open(SNAPSHOT_POINTER) as f:
+            name = f.read().strip()
+    except OSError:
+        return None
+    return os.path.join(VECTOR_CACHE_DIR, name) if name else None
+
+def _snapshot_mtime() -> Optional[float]:
+    """When the current snapshot was published or last confirmed fresh"""
+    try:
+        return os.path.getmtime(SNAPSHOT_POINTER)
+    except OSError:
+        return None
+
+def _publish_snapshot(name: str):
+    """
+    Point SNAPSHOT_POINTER at the snapshot directory name with one atomic
+    rename, so readers see every file of either the old or the new build,
+    then remove all but the newest two builds (the one before stays for
+    readers that resolved the pointer just before the swap)
+    """
+    tmp_path = f'{SNAPSHOT_POINTER}.{os.getpid()}'
+    with open(tmp_path, 'w') as f:
+        f.write(name)
+    os.replace(tmp_path, SNAPSHOT_POINTER)
+
+    builds = sorted(entry for entry in os.listdir(VECTOR_CACHE_DIR) if entry.startswith('snapshot-'))
+    for old in builds[:-2]:
+        if old != name:
+            shutil.rmtree(os.path.join(VECTOR_CACHE_DIR, old), ignore_errors=True)
+
 class SimilaritySearcher:
     def __init__(self):
         self.sas = None
         self.cas_session = None
         self.topic_vectors_data = None
+        # (case_index, TopicMatrix, field_values) served to every search
+        self.vector_index = None
+        # Snapshot directory vector_index was loaded from
+        self._loaded_snapshot = None
+        self._refresh_thread = None
+        self._lock = threading.Lock()
         
     def connect_to_viya(self) -> bool:
         """
@@ -30,18 +130,8 @@ class SimilaritySearcher:
                 logger.error("Failed to create SAS session")
                 return False
             
-            # Test basic SAS functionality
-            test_code = """
-            proc options option=work;
-            run;
-            """
-            result = self.sas.submit(test_code)
-            
-            if 'ERROR' in result['LOG']:
-                logger.error(f"SAS session test failed: {result['LOG']}")
-                return False
-                
-            # Connect to CAS server
+            # Connect to CAS server; when that succeeds the session is working
+            # too, so a healthy connection costs one round trip
             cas_code = """
             cas mySession;
             """
@@ -49,6 +139,17 @@ class SimilaritySearcher:
             
             if 'ERROR' in result['LOG']:
                 logger.warning(f"CAS connection failed: {result['LOG']}")
+                # Only now check the SAS session itself: a broken session is a
+                # failed connection, while CAS being unavailable is not
+                test_code = """
+                proc options option=work;
+                run;
+                """
+                result = self.sas.submit(test_code)
+                if 'ERROR' in result['LOG']:
+                    logger.error(f"SAS session test failed: {result['LOG']}")
+                    return False
+                
                 # Try alternative CAS connection
                 cas_code_alt = """
                 cas;
@@ -68,6 +169,29 @@ class SimilaritySearcher:
             logger.error(f"Error connecting to Viya: {str(e)}")
             return False
     
+    def load_topic_vectors_from_cas(self) -> bool:
+        """
+        Load topic_vectors straight from CAS over SWAT, transferring only the
+        vector and result columns; returns False when SWAT or CAS is unavailable
+        so the caller can fall back to SASPy
+        """
+        if importlib.util.find_spec('swat') is None:
+            return False
+        
+        try:
+            from production_cas import fetch_topic_vectors
+            data = fetch_topic_vectors(keep=_index_column)
+        except Exception as e:
+            logger.warning(f"SWAT load of topic_vectors failed, falling back to SASPy: {str(e)}")
+            return False
+        
+        if data is None or data.empty:
+            return False
+        
+        self.topic_vectors_data = data
+        logger.info(f"Loaded {len(data)} records from topic_vectors over SWAT")
+        return True
+    
     def load_topic_vectors(self) -> bool:
         """
         Load the topic_vectors CAS table from casuser(daodir) library
@@ -127,6 +251,174 @@ class SimilaritySearcher:
             logger.error(f"Error loading topic vectors: {str(e)}")
             return False
     
+    def build_vector_index(self, stamp: Optional[List[str]] = None) -> bool:
+        """
+        Snapshot the loaded topic_vectors into contiguous arrays on disk and
+        memory-map them, so searches never go back to CAS and worker
+        processes share one copy through the page cache
+
+        Args:
+            stamp: CAS table stamp the data was loaded at, stored with the snapshot
+        """
+        try:
+            data = self.topic_vectors_data
+            if data is None or data.empty:
+                logger.error("Topic vectors data not loaded")
+                return False
+
+            case_col = 'Case Number' if 'Case Number' in data.columns else 'case_number'
+            vector_columns = [col for col in data.columns
+                            if col.startswith(VECTOR_COLUMN_PREFIXES)]
+
+            if not vector_columns:
+                logger.error("No vector columns found in topic_vectors data")
+                return False
+
+            # Each build gets its own directory, published in one step once complete
+            name = f'snapshot-{time.time_ns()}-{os.getpid()}'
+            snapshot_dir = os.path.join(VECTOR_CACHE_DIR, name)
+            os.makedirs(snapshot_dir)
+            # Rows are stored as int8 codes with a per-row scale, a quarter of
+            # the float32 bytes; norms come from the float32 vectors
+            matrix = TopicMatrix(data[vector_columns].to_numpy(dtype=np.float32), precision='int8')
+            snapshot = {
+                'cases.npy': data[case_col].astype(str).to_numpy(dtype=str),
+                'norms.npy': matrix.norms,
+                'scale.npy': matrix.scale,
+                'codes.npy': matrix.codes
+            }
+            for file_name, array in snapshot.items():
+                np.save(os.path.join(snapshot_dir, file_name), array)
+
+            metadata = data.drop(columns=vector_columns).reset_index(drop=True)
+            metadata.to_pickle(os.path.join(snapshot_dir, 'meta.pkl'))
+
+            if stamp is not None:
+                with open(os.path.join(snapshot_dir, 'stamp.json'), 'w') as f:
+                    json.dump(stamp, f)
+
+            _publish_snapshot(name)
+
+            # Searches read the snapshot; the loaded frame is no longer needed
+            self.topic_vectors_data = None
+            return self.load_vector_index()
+
+        except Exception as e:
+            logger.error(f"Error building vector index: {str(e)}")
+            return False
+
+    def load_vector_index(self, max_age: Optional[float] = None) -> bool:
+        """
+        Memory-map the published topic_vectors snapshot from VECTOR_CACHE_DIR
+
+        Returns straight away when that snapshot is the one already loaded,
+        so an unchanged snapshot is not re-mapped or re-indexed
+
+        Args:
+            max_age: Ignore snapshots older than this many seconds
+        """
+        try:
+            published = _snapshot_mtime()
+            snapshot_dir = _current_snapshot_dir()
+            if published is None or snapshot_dir is None:
+                return False
+            if max_age is not None and time.time() - published > max_age:
+                return False
+            # Every build gets a fresh directory, so the same path means the same data
+            if self.vector_index is not None and snapshot_dir == self._loaded_snapshot:
+                return True
+
+            cases = np.load(os.path.join(snapshot_dir, 'cases.npy'), mmap_mode='r')
+            matrix = TopicMatrix.from_arrays(
+                np.load(os.path.join(snapshot_dir, 'codes.npy'), mmap_mode='r'),
+                np.load(os.path.join(snapshot_dir, 'scale.npy'), mmap_mode='r'),
+                np.load(os.path.join(snapshot_dir, 'norms.npy'), mmap_mode='r')
+            )
+            metadata = pd.read_pickle(os.path.join(snapshot_dir, 'meta.pkl'))
+            if not (len(cases) == len(matrix) == len(matrix.scale) == len(matrix.norms) == len(metadata)):
+                logger.warning("Vector snapshot files are out of step; ignoring snapshot")
+                return False
+
+            case_index = {case: idx for idx, case in enumerate(cases.tolist())}
+            # Each result field becomes one array, resolved from its source
+            # column once per snapshot (None when the table lacks it)
+            field_values = {}
+            for field, (columns, _) in RESULT_FIELD_SOURCES.items():
+                column = next((col for col in columns if col in metadata.columns), None)
+                field_values[field] = metadata[column].to_numpy() if column is not None else None
+            # Large corpora are searched through an HNSW graph when faiss is installed
+            if matrix.build_ann_index():
+                logger.info("Built HNSW index for approximate search")
+            self.vector_index = (case_index, matrix, field_values)
+            self._loaded_snapshot = snapshot_dir
+            logger.info(f"Vector index ready: {len(matrix)} cases x {matrix.codes.shape[1]} topics")
+            return True
+
+        except Exception as e:
+            logger.warning(f"Could not load vector snapshot: {str(e)}")
+            return False
+
+    def _table_stamp(self) -> Optional[List[str]]:
+        """topic_vectors' modification time and row count from CAS, or None without SWAT"""
+        if importlib.util.find_spec('swat') is None:
+            return None
+        from production_cas import fetch_topic_vectors_stamp
+        return fetch_topic_vectors_stamp()
+
+    def _snapshot_stamp(self) -> Optional[List[str]]:
+        """The table stamp recorded with the published snapshot, if any"""
+        snapshot_dir = _current_snapshot_dir()
+        if snapshot_dir is None:
+            return None
+        try:
+            with open(os.path.join(snapshot_dir, 'stamp.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def refresh_vector_index(self) -> bool:
+        """
+        Reload topic_vectors from CAS or Viya and rebuild the snapshot, unless
+        CAS reports the table unchanged since the snapshot was taken
+        """
+        with self._lock:
+            requested = time.time()
+            with _snapshot_build_lock():
+                # Another worker finished a build while this one waited for the lock
+                published = _snapshot_mtime()
+                if published is not None and published >= requested:
+                    return self.load_vector_index()
+
+                stamp = self._table_stamp()
+                if stamp is not None and stamp == self._snapshot_stamp():
+                    # Mark the snapshot fresh for every worker and skip the full transfer
+                    os.utime(SNAPSHOT_POINTER)
+                    logger.info("topic_vectors unchanged in CAS; reusing snapshot")
+                    return self.vector_index is not None or self.load_vector_index()
+
+                # SWAT fetches typed columns directly; SASPy is the fallback
+                if not self.load_topic_vectors_from_cas():
+                    if self.sas is None and not self.connect_to_viya():
+                        return False
+                    if not self.load_topic_vectors():
+                        return False
+                return self.build_vector_index(stamp)
+
+    def start_background_refresh(self, interval: float = VECTOR_REFRESH_SECONDS):
+        """Rebuild the vector index every interval seconds in a daemon thread"""
+        if self._refresh_thread is not None and self._refresh_thread.is_alive():
+            return
+
+        def refresh_loop():
+            while True:
+                time.sleep(interval)
+                # Another worker may already have written a fresh snapshot
+                if not self.load_vector_index(max_age=interval) and not self.refresh_vector_index():
+                    logger.warning("Background vector refresh failed; serving previous snapshot")
+
+        self._refresh_thread = threading.Thread(target=refresh_loop, name='vector-refresh', daemon=True)
+        self._refresh_thread.start()
+
     def calculate_similarity(self, case_number: str, top_k: int = 5) -> List[Dict]:
         """
         Calculate cosine similarity for a given case number
@@ -138,69 +430,63 @@ class SimilaritySearcher:
         Returns:
             List of dictionaries containing similar cases with scores
         """
+        return self.calculate_similarities([(case_number, top_k)])[0]
+
+    def calculate_similarities(self, requests: List[Tuple[str, int]]) -> List[List[Dict]]:
+        """
+        Calculate cosine similarity for a batch of (case_number, top_k) searches
+        
+        All targets are scored against the index in one matrix multiply
+        
+        Returns:
+            One list of similar cases per request, in request order
+        """
+        results = [[] for _ in requests]
         try:
-            if self.topic_vectors_data is None:
+            if self.vector_index is None:
                 logger.error("Topic vectors data not loaded")
-                return []
-            
-            # Find the target case - check both possible column names
-            case_col = 'Case Number' if 'Case Number' in self.topic_vectors_data.columns else 'case_number'
-            target_case = self.topic_vectors_data[
-                self.topic_vectors_data[case_col] == case_number
-            ]
-            
-            if target_case.empty:
-                logger.warning(f"Case number {case_number} not found in topic_vectors")
-                return []
-            
-            # Extract vector columns based on your table structure
-            vector_columns = [col for col in self.topic_vectors_data.columns 
-                            if col.startswith(('_TextTopic_', '_Col'))]
-            
-            if not vector_columns:
-                logger.error("No vector columns found in topic_vectors data")
-                return []
-            
-            # Get target vector - handle DataFrame row selection properly
-            target_row = target_case[vector_columns].iloc[0]
-            target_vector = np.array(target_row).reshape(1, -1)
-            
-            # Get all vectors as numpy array
-            all_vectors = self.topic_vectors_data[vector_columns].to_numpy()
-            
-            # Calculate cosine similarity
-            similarities = cosine_similarity(target_vector, all_vectors)[0]
+                return results
+
+            case_index, matrix, field_values = self.vector_index
+            pending = []
+            for i, (case_number, _) in enumerate(requests):
+                if case_number in case_index:
+                    pending.append(i)
+                else:
+                    logger.warning(f"Case number {case_number} not found in topic_vectors")
             
-            # Create results with similarity scores
-            results = []
-            for idx, similarity_score in enumerate(similarities):
-                row = self.topic_vectors_data.iloc[idx]
-                
-                # Skip the target case itself
-                current_case_number = row.get('Case Number', row.get('case_number', ''))
-                if current_case_number == case_number:
-                    continue
-                
-                result = {
-                    'case_number': row.get('Case Number', row.get('case_number', 'Unknown')),
-                    'similarity_score': float(similarity_score),
-                    'resolution': row.get('Resolution', row.get('resolution', 'No resolution available')),
-                    'title': row.get('Description', row.get('Concern', row.get('description', 'No description available'))),
-                    'assignment_group': row.get('Assignment Group', row.get('assignment_group', 'Unknown')),
-                    'case_type': row.get('case_type', 'Unknown'),
-                    'status': row.get('status', 'Unknown')
-                }
-                results.append(result)
+            if not pending:
+                return results
             
-            # Sort by similarity score and return top_k
-            results.sort(key=lambda x: x['similarity_score'], reverse=True)
+            # Rank every target against every case: one int8 GEMM (SimSIMD's SIMD
+            # kernels when installed) or, for large corpora under numba, one fused
+            # parallel score + top-k pass over the matrix for all targets
+            target_idx = np.array([case_index[requests[i][0]] for i in pending])
+            max_k = max(requests[i][1] for i in pending)
+            ranked = matrix.rows_top_k(target_idx, max_k)
             
-            logger.info(f"Found {len(results[:top_k])} similar cases for {case_number}")
-            return results[:top_k]
+            for i, (top, scores) in zip(pending, ranked):
+                case_number, top_k = requests[i]
+                results[i] = self._format_results(field_values, top[:top_k], scores[:top_k])
+                logger.info(f"Found {len(results[i])} similar cases for {case_number}")
+            return results
             
         except Exception as e:
             logger.error(f"Error calculating similarity: {str(e)}")
-            return []
+            return results
+
+    def _format_results(self, field_values: Dict[str, Optional[np.ndarray]],
+                        top: np.ndarray, scores: np.ndarray) -> List[Dict]:
+        """Create results for the ranked rows top with their similarity scores"""
+        # Gather each output field from its array instead of building a Series per row
+        fields = {}
+        for field, (_, default) in RESULT_FIELD_SOURCES.items():
+            values = field_values[field]
+            fields[field] = values[top].tolist() if values is not None else [default] * len(top)
+        fields['similarity_score'] = scores.astype(float).tolist()
+        
+        return [dict(zip(RESULT_FIELD_ORDER, values))
+                for values in zip(*(fields[field] for field in RESULT_FIELD_ORDER))]
     
     def disconnect(self):
         """Clean up connections"""
@@ -214,6 +500,47 @@ class SimilaritySearcher:
 # Global instance
 similarity_searcher = SimilaritySearcher()
 
+# Concurrent searches arriving within 5 ms share one GEMM against the index
+_search_batcher = QueryBatcher(similarity_searcher.calculate_similarities, max_batch=64, max_wait=0.005)
+
+# Held while the index is being loaded so a search arriving during warmup
+# waits for that load instead of starting a second one
+_preload_lock = threading.Lock()
+
+def preload_topic_vectors(timeout: float = -1) -> bool:
+    """
+    Make the vector index available before the first search
+    Reuses a fresh on-disk snapshot when one exists, otherwise loads from Viya,
+    then keeps the index refreshed in the background. Waits at most timeout
+    seconds (forever when negative) for a load already in progress.
+    """
+    if not _preload_lock.acquire(timeout=timeout):
+        logger.warning("Timed out waiting for topic vectors to load")
+        return False
+    try:
+        if similarity_searcher.vector_index is None:
+            if not similarity_searcher.load_vector_index(max_age=VECTOR_REFRESH_SECONDS):
+                if not similarity_searcher.refresh_vector_index():
+                    logger.error("Failed to load topic vectors data")
+                    return False
+            # Pay numba's JIT here rather than in the first search
+            similarity_searcher.vector_index[1].warm_up()
+        
+        similarity_searcher.start_background_refresh()
+        return True
+        
+    except Exception as e:
+        logger.error(f"Error preloading topic vectors: {str(e)}")
+        return False
+    finally:
+        _preload_lock.release()
+
+def start_preload() -> threading.Thread:
+    """Warm the vector index on a daemon thread so the first search does not pay for it"""
+    thread = threading.Thread(target=preload_topic_vectors, name='vector-preload', daemon=True)
+    thread.start()
+    return thread
+
 def get_similar_cases(case_number: str, top_k: int = 5) -> List[Dict]:
     """
     Main function to get similar cases for a given case number
@@ -226,29 +553,36 @@ def get_similar_cases(case_number: str, top_k: int = 5) -> List[Dict]:
         List of dictionaries containing similar cases with similarity scores
     """
     try:
-        # Initialize connection if not already done
-        if similarity_searcher.sas is None:
-            if not similarity_searcher.connect_to_viya():
-                logger.error("Failed to connect to SAS Viya")
-                return []
-        
-        # Load data if not already loaded
-        if similarity_searcher.topic_vectors_data is None:
-            if not similarity_searcher.load_topic_vectors():
-                logger.error("Failed to load topic vectors data")
-                return []
-        
-        # Ensure data is available before calculating similarities
-        if similarity_searcher.topic_vectors_data is not None and len(similarity_searcher.topic_vectors_data) > 0:
-            return similarity_searcher.calculate_similarity(case_number, top_k)
-        else:
-            logger.error("No topic vectors data available for similarity calculation")
+        # Searches are served from the in-memory index once it is loaded
+        if similarity_searcher.vector_index is None and not preload_topic_vectors(PRELOAD_WAIT_SECONDS):
             return []
         
+        return _search_batcher.submit((case_number, top_k)).result(timeout=SEARCH_TIMEOUT_SECONDS)
+        
     except Exception as e:
         logger.error(f"Error in get_similar_cases: {str(e)}")
         return []
 
+def get_similar_cases_batch(case_numbers: List[str], top_k: int = 5) -> Dict[str, List[Dict]]:
+    """
+    Find similar cases for each of several case numbers, ranking them all
+    in one pass over the vector index
+
+    Returns:
+        Dictionary mapping each case number to its list of similar cases
+    """
+    results = {case_number: [] for case_number in case_numbers}
+    try:
+        if similarity_searcher.vector_index is None and not preload_topic_vectors(PRELOAD_WAIT_SECONDS):
+            return results
+
+        ranked = similarity_searcher.calculate_similarities([(case_number, top_k) for case_number in results])
+        return dict(zip(results, ranked))
+
+    except Exception as e:
+        logger.error(f"Error in get_similar_cases_batch: {str(e)}")
+        return results
+
 def test_connection():
     """Test function to verify SAS Viya connection"""
     try:
@@ -272,5 +606,11 @@ def test_connection():
         return False
 
 if __name__ == "__main__":
-    # Test the connection and functionality
-    test_connection()
\ No newline at end of file
+    from network_test import sasurl_reachable
+    from sascfg_personal import viya
+    
+    # Test the connection and functionality, skipping straight away when the host is unreachable
+    if sasurl_reachable(viya['sasurl']):
+        test_connection()
+    else:
+        print("⚠ SKIP: SAS Viya host unreachable")
\ No newline at end of file
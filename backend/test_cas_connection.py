@@ -11,6 +11,9 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# One keep-alive session so every endpoint check reuses the same connection
+_SESSION = requests.Session()
+
 def test_flask_endpoints():
     """Test the Flask endpoints for CAS connectivity"""
     base_url = f"http://{os.getenv('FLASK_HOST', '0.0.0.0')}:{os.getenv('FLASK_PORT', 5001)}"
@@ -21,7 +24,7 @@ def test_flask_endpoints():
     # Test CAS status endpoint
     try:
         print("\n1. Testing /cas-status endpoint...")
-        response = requests.get(f"{base_url}/cas-status", timeout=10)
+        response = _SESSION.get(f"{base_url}/cas-status", timeout=10)
         print(f"Status Code: {response.status_code}")
         result = response.json()
         print(f"Response: {json.dumps(result, indent=2)}")
@@ -37,7 +40,7 @@ def test_flask_endpoints():
     # Test table preview endpoint
     try:
         print("\n2. Testing /table-preview endpoint...")
-        response = requests.get(f"{base_url}/table-preview", timeout=10)
+        response = _SESSION.get(f"{base_url}/table-preview", timeout=10)
         print(f"Status Code: {response.status_code}")
         result = response.json()
         print(f"Response: {json.dumps(result, indent=2)}")
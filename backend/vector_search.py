@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Vectorized cosine similarity for topic_vectors rows
+Shared ranking helpers used by the CAS clients
+"""
+
+import functools
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+@functools.lru_cache(maxsize=None)
+def _numba():
+    """numba, imported on first use; None when not installed"""
+    try:
+        import numba
+    except ImportError:
+        return None
+    return numba
+
+@functools.lru_cache(maxsize=None)
+def _simsimd():
+    """simsimd, imported on first use; None when not installed"""
+    try:
+        import simsimd
+    except ImportError:
+        return None
+    return simsimd
+
+@functools.lru_cache(maxsize=None)
+def _faiss():
+    """faiss, imported on first use; None when not installed"""
+    try:
+        import faiss
+    except ImportError:
+        return None
+    return faiss
+
+TOPIC_PREFIX = '_TextTopic_'
+
+def topic_columns(columns: Iterable[str]) -> List[str]:
+    """Return the _TextTopic_* columns in table order"""
+    return [col for col in columns if col.startswith(TOPIC_PREFIX)]
+
+# Corpus size from which the numba kernel replaces NumPy matmul
+NUMBA_MIN_ROWS = 10000
+
+@functools.lru_cache(maxsize=None)
+def _dot_rows_kernel():
+    """Compile the numba row-dot kernel on first use (loaded from numba's on-disk cache afterwards)"""
+    numba = _numba()
+
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def dot_rows(rows, target, out):
+        for i in numba.prange(rows.shape[0]):
+            acc = np.float32(0.0)
+            for j in range(rows.shape[1]):
+                acc += np.float32(rows[i, j]) * np.float32(target[j])
+            out[i] = acc
+
+    return dot_rows
+
+def dot_rows(rows: np.ndarray, target: np.ndarray) -> np.ndarray:
+    """
+    rows @ target as float32, through the parallel numba kernel for
+    NUMBA_MIN_ROWS or more rows (numba has no float16; those use NumPy)
+    """
+    if rows.dtype != np.float16 and len(rows) >= NUMBA_MIN_ROWS and _numba() is not None:
+        out = np.empty(len(rows), dtype=np.float32)
+        _dot_rows_kernel()(rows, np.ascontiguousarray(target), out)
+        return out
+    if rows.dtype == np.int8:
+        return np.matmul(rows, target, dtype=np.int32).astype(np.float32)
+    return np.matmul(rows, target, dtype=np.float32)
+
+@functools.lru_cache(maxsize=None)
+def _row_top_k_kernel():
+    """
+    Compile the fused score + top-k numba kernel on first use
+
+    Each of n_chunks parallel chunks streams its rows once, scores each row
+    against every stored row in target_idx while it is in cache, and keeps
+    a best top_k per target in an insertion-sorted buffer, so no N-long
+    score array is written; the caller merges the chunks.
+    """
+    numba = _numba()
+
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def row_top_k(codes, scale, norms, target_idx, top_k, n_chunks):
+        n, d = codes.shape
+        n_targets = target_idx.shape[0]
+        best_scores = np.full((n_targets, n_chunks, top_k), -np.inf, dtype=np.float32)
+        best_rows = np.full((n_targets, n_chunks, top_k), -1, dtype=np.int64)
+        chunk = (n + n_chunks - 1) // n_chunks
+        for c in numba.prange(n_chunks):
+            for i in range(c * chunk, min(n, (c + 1) * chunk)):
+                for b in range(n_targets):
+                    t = target_idx[b]
+                    if i == t:
+                        continue
+                    acc = np.float32(0.0)
+                    for j in range(d):
+                        acc += np.float32(codes[i, j]) * np.float32(codes[t, j])
+                    score = acc * scale[i] * scale[t] / (norms[i] * norms[t] + np.float32(1e-12))
+                    scores = best_scores[b, c]
+                    rows = best_rows[b, c]
+                    if score > scores[top_k - 1]:
+                        pos = top_k - 1
+                        while pos > 0 and scores[pos - 1] < score:
+                            scores[pos] = scores[pos - 1]
+                            rows[pos] = rows[pos - 1]
+                            pos -= 1
+                        scores[pos] = score
+                        rows[pos] = i
+        return best_scores, best_rows
+
+    return row_top_k
+
+def top_k_indices(scores: np.ndarray, top_k: int, exclude: Optional[int] = None) -> np.ndarray:
+    """
+    Indices of the top_k highest scores, best first
+
+    Args:
+        scores: 1-D array of similarity scores
+        top_k: Number of indices to return
+        exclude: Optional row index to leave out (the target case itself);
+            its score is masked in place during the selection and restored
+    """
+    count = min(top_k, scores.size - (exclude is not None))
+    if count <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    # Mask the excluded row to -inf for the selection instead of filtering afterwards
+    if exclude is not None:
+        kept, scores[exclude] = scores[exclude], -np.inf
+    try:
+        top = np.argpartition(-scores, count - 1)[:count]
+        return top[np.argsort(-scores[top])]
+    finally:
+        if exclude is not None:
+            scores[exclude] = kept
+
+# Corpora at least this large get an approximate HNSW index when faiss is installed
+ANN_MIN_ROWS = 50000
+HNSW_M = 32
+HNSW_EF_SEARCH = 128
+
+def quantize_int8(vectors: np.ndarray):
+    """Symmetric per-row int8 quantization; returns (codes, scale) with vectors ~= codes * scale"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scale = np.abs(vectors).max(axis=1) / 127.0
+    scale[scale == 0] = 1.0
+    codes = np.round(vectors / scale[:, None]).astype(np.int8)
+    return codes, scale.astype(np.float32)
+
+def _simsimd_similarities(targets: np.ndarray, rows: np.ndarray,
+                          target_norms: np.ndarray, row_norms: np.ndarray) -> np.ndarray:
+    """Cosine similarity via SimSIMD's runtime-dispatched SIMD kernels; zero-norm pairs score 0"""
+    sims = 1.0 - np.asarray(_simsimd().cdist(targets, rows, metric='cosine'), dtype=np.float32)
+    sims[:, row_norms == 0] = 0
+    sims[target_norms == 0] = 0
+    return sims
+
+class TopicMatrix:
+    """
+    In-memory topic-vector corpus used for local scoring
+
+    Rows are stored as int8 codes with a per-row scale by default, cutting
+    the bytes streamed per query 4x versus float32; precision='float16'
+    halves them with no scale and is computed in float32. Row norms are taken from
+    the original float32 vectors so scores stay true cosine similarities.
+    Scoring uses SimSIMD's cosine kernels when simsimd is installed, else a
+    parallel numba kernel for corpora of NUMBA_MIN_ROWS or more, else NumPy.
+    rows_top_k switches to an approximate faiss HNSW index once
+    build_ann_index has built one.
+    """
+
+    def __init__(self, vectors: np.ndarray, precision: str = 'int8'):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.precision = precision
+        self.norms = np.linalg.norm(vectors, axis=1).astype(np.float32)
+        if precision == 'int8':
+            self.codes, self.scale = quantize_int8(vectors)
+        elif precision in ('float16', 'float32'):
+            self.codes, self.scale = vectors.astype(precision, copy=False), None
+        else:
+            raise ValueError(f"Unsupported precision: {precision}")
+        self.ann = None
+
+    @classmethod
+    def from_arrays(cls, codes: np.ndarray, scale: Optional[np.ndarray], norms: np.ndarray) -> 'TopicMatrix':
+        """Rebuild a matrix from stored codes, scale (None unless int8) and norms, e.g. memory-mapped files"""
+        matrix = cls.__new__(cls)
+        matrix.precision = 'int8' if scale is not None else str(codes.dtype)
+        matrix.codes, matrix.scale, matrix.norms = codes, scale, norms
+        matrix.ann = None
+        return matrix
+
+    def __len__(self) -> int:
+        return self.codes.shape[0]
+
+    def _dots(self, target_codes: np.ndarray) -> np.ndarray:
+        """Raw dot products of each (B, D) target against every stored row; returns (B, N) float32"""
+        # numba has no float16 arrays; those go through NumPy
+        if len(self) >= NUMBA_MIN_ROWS and self.precision != 'float16' and _numba() is not None:
+            return np.stack([dot_rows(self.codes, target) for target in target_codes])
+
+        if self.scale is None:
+            return np.matmul(target_codes, self.codes.T, dtype=np.float32)
+        return np.matmul(target_codes, self.codes.T, dtype=np.int32).astype(np.float32)
+
+    def similarities(self, targets: np.ndarray) -> np.ndarray:
+        """Cosine similarity of each (B, D) target against every stored row; returns (B, N)"""
+        targets = np.atleast_2d(np.asarray(targets, dtype=np.float32))
+        target_norms = np.linalg.norm(targets, axis=1)
+
+        if _simsimd() is not None:
+            target_rows = targets.astype(self.codes.dtype) if self.scale is None else quantize_int8(targets)[0]
+            return _simsimd_similarities(target_rows, self.codes, target_norms, self.norms)
+
+        if self.scale is None:
+            dots = self._dots(targets)
+        else:
+            target_codes, target_scale = quantize_int8(targets)
+            dots = self._dots(target_codes)
+            dots *= np.outer(target_scale, self.scale)
+
+        return dots / (np.outer(target_norms, self.norms) + 1e-12)
+
+    def row_similarities(self, index: int) -> np.ndarray:
+        """Cosine similarity of stored row index against every stored row; returns (N,)"""
+        return self.rows_similarities([index])[0]
+
+    def _unit_rows(self, indices=slice(None)) -> np.ndarray:
+        """Stored rows decoded to float32 and scaled to unit length; all-zero rows stay zero"""
+        rows = self.codes[indices].astype(np.float32)
+        if self.scale is not None:
+            rows *= self.scale[indices, None]
+        norms = self.norms[indices]
+        rows /= np.where(norms > 0, norms, 1)[:, None]
+        return rows
+
+    def build_ann_index(self) -> bool:
+        """
+        Build a faiss HNSW inner-product index over the unit rows so rows_top_k
+        visits a few hundred candidates instead of every row
+
+        Skipped (returns False) without faiss or below ANN_MIN_ROWS rows, where
+        the exact scan is already cheap. Results become approximate.
+        """
+        if len(self) < ANN_MIN_ROWS:
+            return False
+        faiss = _faiss()
+        if faiss is None:
+            return False
+        if self.ann is None:
+            index = faiss.IndexHNSWFlat(self.codes.shape[1], HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            index.add(self._unit_rows())
+            index.hnsw.efSearch = HNSW_EF_SEARCH
+            self.ann = index
+        return True
+
+    def rows_top_k(self, indices, top_k: int) -> List[Any]:
+        """
+        Best top_k (row indices, scores) for each stored row in indices, best
+        first and excluding the row itself
+
+        Searches the HNSW index when one has been built; otherwise uses the
+        fused numba kernel when numba is the scoring path, so no N-long score
+        array is materialized; otherwise rows_similarities and top_k_indices.
+        """
+        if top_k > 0 and self.ann is not None:
+            indices = np.asarray(indices, dtype=np.intp)
+            # One extra neighbour, since each row normally finds itself first
+            scores, rows = self.ann.search(self._unit_rows(indices), top_k + 1)
+            ranked = []
+            for index, row_scores, row_ids in zip(indices, scores, rows):
+                keep = (row_ids >= 0) & (row_ids != index)
+                ranked.append((row_ids[keep][:top_k].astype(np.intp), row_scores[keep][:top_k]))
+            return ranked
+
+        if (top_k > 0 and len(self) >= NUMBA_MIN_ROWS and self.precision != 'float16'
+                and _simsimd() is None and _numba() is not None):
+            kernel = _row_top_k_kernel()
+            scale = self.scale if self.scale is not None else np.ones(len(self), dtype=np.float32)
+            n_chunks = _numba().get_num_threads() * 4
+            # Every target is scored in the same pass over the matrix
+            best_scores, best_rows = kernel(self.codes, scale, self.norms,
+                                            np.asarray(indices, dtype=np.int64), top_k, n_chunks)
+            ranked = []
+            for scores, rows in zip(best_scores, best_rows):
+                scores, rows = scores.ravel(), rows.ravel()
+                order = np.argsort(-scores, kind='stable')[:top_k]
+                order = order[rows[order] >= 0]
+                ranked.append((rows[order].astype(np.intp), scores[order]))
+            return ranked
+
+        ranked = []
+        for index, scores in zip(indices, self.rows_similarities(indices)):
+            top = top_k_indices(scores, top_k, exclude=int(index))
+            ranked.append((top, scores[top]))
+        return ranked
+
+    def warm_up(self):
+        """
+        Run one throwaway search so the kernels the real searches will use
+        are compiled (or loaded from numba's cache) ahead of the first request
+        """
+        if len(self) > 1:
+            self.rows_top_k([0], 1)
+
+    def rows_similarities(self, indices) -> np.ndarray:
+        """Cosine similarity of each stored row in indices against every stored row; returns (B, N)"""
+        indices = np.asarray(indices, dtype=np.intp)
+        if _simsimd() is not None:
+            return _simsimd_similarities(self.codes[indices], self.codes,
+                                         self.norms[indices], self.norms)
+
+        dots = self._dots(self.codes[indices])
+        if self.scale is not None:
+            dots *= np.outer(self.scale[indices], self.scale)
+
+        return dots / (np.outer(self.norms[indices], self.norms) + 1e-12)
+
+# topic_vectors columns returned for each similar case
+RESULT_COLUMNS = ['Case Number', 'Description', 'Resolution', 'Assignment Group', 'Concern']
+
+def result_records(rows) -> List[tuple]:
+    """
+    Precompute each topic_vectors row (a DataFrame) as a tuple of its result
+    fields in RESULT_COLUMNS order, with title and resolution already truncated
+    """
+    picked = rows.reindex(columns=RESULT_COLUMNS, fill_value='').astype(str)
+    picked['Description'] = picked['Description'].str.slice(0, 100)
+    picked['Resolution'] = picked['Resolution'].str.slice(0, 100)
+    return list(picked.itertuples(index=False, name=None))
+
+def ranked_results(records: List[tuple], rows, similarities) -> List[Dict[str, Any]]:
+    """Similar-case results for the ranked row indices, looked up in precomputed records"""
+    results = []
+    for idx, score in zip(rows, np.round(np.asarray(similarities, dtype=np.float64), 4).tolist()):
+        case, title, resolution, group, concern = records[idx]
+        results.append({
+            'case_number': case,
+            'similarity_score': score,
+            'title': title,
+            'resolution': resolution,
+            'assignment_group': group,
+            'case_type': concern,
+            'status': 'resolved'
+        })
+    return results
+
+def case_results(rows, similarities) -> List[Dict[str, Any]]:
+    """Format ranked topic_vectors rows (a DataFrame) as similar-case results"""
+    return ranked_results(result_records(rows), range(len(rows)), similarities)
+
+def where_literal(value: str) -> str:
+    """Quote a value as a string constant for a CAS where clause"""
+    return '"' + str(value).replace('"', '""') + '"'
+
+def _sql_literal(value: str) -> str:
+    """Quote a value as a FedSQL string literal"""
+    return "'" + str(value).replace("'", "''") + "'"
+
+def cosine_topk_query(table: str, topic_cols: List[str], target: np.ndarray,
+                      exclude_case: str, select_cols: List[str], top_k: int) -> str:
+    """
+    Build a FedSQL query that ranks rows by cosine similarity to target
+
+    The target vector is folded into the statement as constants so CAS scores
+    every row next to the data and only the top_k rows come back.
+    """
+    target_norm = float(np.linalg.norm(target))
+    dot = ' + '.join(f'{float(w)!r} * "{col}"' for w, col in zip(target, topic_cols))
+    norm = 'SQRT(' + ' + '.join(f'"{col}" * "{col}"' for col in topic_cols) + ')'
+    columns = ', '.join(f'"{col}"' for col in select_cols)
+    return (
+        f'SELECT {columns}, '
+        f'CASE WHEN {norm} > 0 THEN ({dot}) / ({norm} * {target_norm!r}) ELSE 0 END AS similarity_score '
+        f'FROM {table} '
+        f'WHERE "Case Number" <> {_sql_literal(exclude_case)} '
+        f'ORDER BY similarity_score DESC '
+        f'LIMIT {int(top_k)}'
+    )
@@ -5,6 +5,24 @@ import { z } from "zod";
 import { spawn } from "child_process";
 import path from "path";
 
+// Most case numbers accepted by one /api/search-similar-batch request
+const MAX_BATCH_CASE_NUMBERS = 100;
+
+const searchBatchSchema = z.object({
+  case_numbers: z
+    .array(z.string().trim().min(1, "case_numbers must contain non-empty strings"), {
+      required_error: "case_numbers is required",
+      invalid_type_error: "case_numbers must be an array of strings"
+    })
+    .min(1, "case_numbers must be a non-empty array")
+    .max(MAX_BATCH_CASE_NUMBERS, `case_numbers may contain at most ${MAX_BATCH_CASE_NUMBERS} entries`),
+  top_k: z
+    .number({ invalid_type_error: "top_k must be a positive integer" })
+    .int("top_k must be a positive integer")
+    .positive("top_k must be a positive integer")
+    .default(5)
+});
+
 // Helper function to execute Python CAS scripts with authentic server connectivity
 async function executePythonScript(functionName: string, params: any = {}): Promise<any> {
   return new Promise((resolve, reject) => {
@@ -17,12 +35,17 @@ sys.path.append('${path.join(process.cwd(), 'backend')}')
 try:
     from cas_service import ${functionName}
     
+    # Parameters arrive as JSON in argv rather than being spliced into this source
+    params = json.loads(sys.argv[1])
+    
     if '${functionName}' == 'test_cas_server_connection':
         result = ${functionName}()
     elif '${functionName}' == 'load_topic_vectors_preview':
-        result = ${functionName}(${params.rows || 5})
+        result = ${functionName}(params.get('rows') or 5)
+    elif '${functionName}' == 'get_similar_cases_batch':
+        result = ${functionName}(params['case_numbers'], params.get('top_k') or 5)
     else:
-        result = ${functionName}('${params.case_number}', ${params.top_k || 5})
+        result = ${functionName}(params['case_number'], params.get('top_k') or 5)
     
     print(json.dumps(result))
 except Exception as e:
@@ -34,7 +57,7 @@ except Exception as e:
     print(json.dumps(error_result))
 `;
 
-    const python = spawn('python3', ['-c', pythonScript], {
+    const python = spawn('python3', ['-c', pythonScript, JSON.stringify(params)], {
       cwd: process.cwd(),
       env: { ...process.env }
     });
@@ -192,6 +215,39 @@ export async function registerRoutes(app: Express): Promise<Server> {
     }
   });
 
+  // Batched similarity search: one Python process, one CAS session and one
+  // matrix multiply for several case numbers
+  app.post("/api/search-similar-batch", async (req, res) => {
+    try {
+      const parsed = searchBatchSchema.safeParse(req.body);
+      
+      if (!parsed.success) {
+        return res.status(400).json({
+          success: false,
+          error: parsed.error.issues[0].message
+        });
+      }
+
+      const { case_numbers, top_k } = parsed.data;
+      const result = await executePythonScript('get_similar_cases_batch', { 
+        case_numbers, 
+        top_k: Math.min(top_k, 20) 
+      });
+      
+      res.json({
+        success: true,
+        results: result
+      });
+    } catch (error) {
+      res.status(503).json({
+        success: false,
+        error: "Similarity search failed",
+        message: error.message,
+        note: "Requires connection to SAS Viya server"
+      });
+    }
+  });
+
   const httpServer = createServer(app);
   return httpServer;
 }